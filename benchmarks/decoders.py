@@ -0,0 +1,79 @@
+"""Time the JSON decoders of swapi.decoder on a full catalog load
+
+    python benchmarks/decoders.py --rounds 200
+
+The list pages of every resource are downloaded once from a local swapi
+stand-in, then decoded over and over with each installed decoder: alone,
+and followed by the building of the slot models, as swapi.get_all() does.
+Decoding straight into msgspec structs is left out, the slot models
+parse their own fields and a struct schema would duplicate them.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starfilm  # Puts the swapi modules on sys.path
+from swapi import settings
+from swapi.cache import set_cache
+from swapi.decoder import DECODERS, loads, set_decoder
+from swapi.models import MODELS
+from swapi.standin import StandIn, load_fixtures
+from swapi.utils import query
+
+
+def download_pages(base_url):
+    """Return (resource, raw JSON) of every list page of the catalog
+    """
+    pages = []
+    for resource in MODELS:
+        url = "{0}/{1}/".format(base_url, resource)
+        while url:
+            content = query(url, backend="http").content
+            pages.append((resource, content))
+            url = loads(content)["next"]
+    return pages
+
+
+def decode(pages):
+    for _, content in pages:
+        loads(content)
+
+
+def decode_and_build(pages):
+    for resource, content in pages:
+        [MODELS[resource](json_data) for json_data in loads(content)["results"]]
+
+
+def median_time(function, pages, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function(pages)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--fixtures", default=settings.FIXTURES_PATH)
+    args = parser.parse_args(argv)
+
+    set_cache(None)
+    with StandIn(load_fixtures(args.fixtures)) as server:
+        pages = download_pages(server.base_url)
+    print(f"{len(pages)} pages, {sum(len(content) for _, content in pages) / 1024:.0f} kB")
+
+    for name in DECODERS:
+        set_decoder(name)
+        decoding = median_time(decode, pages, args.rounds)
+        building = median_time(decode_and_build, pages, args.rounds)
+        print(f"{name:8} decode {decoding * 1000:.2f} ms   decode + models {building * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
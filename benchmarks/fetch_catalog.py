@@ -0,0 +1,50 @@
+"""Time a full catalog load against a local swapi stand-in
+
+    python benchmarks/fetch_catalog.py --latency 0.1 --runs 3
+
+Every resource type is loaded with swapi.get_all(), with the response cache
+disabled and the identity map emptied before each run, so each run does the
+whole download.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starfilm  # Puts the swapi modules on sys.path
+from swapi import settings, swapi
+from swapi.cache import set_cache
+from swapi.identity import identity_map
+from swapi.standin import StandIn, load_fixtures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--fixtures", default=settings.FIXTURES_PATH)
+    args = parser.parse_args(argv)
+
+    catalog = load_fixtures(args.fixtures)
+    set_cache(None)
+    with StandIn(catalog, latency=args.latency, jitter=args.jitter,
+                 error_rate=args.error_rate, seed=0) as server:
+        settings.BASE_URL = server.base_url
+        timings = []
+        for run in range(args.runs):
+            identity_map.clear()
+            server.hits = 0
+            start = time.perf_counter()
+            models = sum(len(swapi.get_all(resource).items) for resource in catalog)
+            timings.append(time.perf_counter() - start)
+            print(f"run {run + 1}: {models} models, {server.hits} requests, {timings[-1]:.2f} s")
+    print(f"median {statistics.median(timings):.2f} s at {args.latency * 1000:.0f} ms latency")
+
+
+if __name__ == "__main__":
+    main()
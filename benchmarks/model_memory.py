@@ -0,0 +1,73 @@
+"""Compare the memory held by the original and the slot models on the full catalog
+
+    python benchmarks/model_memory.py
+
+The catalog is downloaded once from a local swapi stand-in, then every
+resource is built from its raw JSON payload twice, under tracemalloc: with
+the original models, which set every key of the payload in an instance
+__dict__, and with the typed __slots__ models of swapi.models.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import starfilm  # Puts the swapi modules on sys.path
+from swapi import settings
+from swapi.cache import set_cache
+from swapi.mirror import crawl
+from swapi.models import MODELS
+from swapi.standin import StandIn, load_fixtures
+
+
+class DictModel(object):
+    """The model of swapi.models before the slot models: the payload in __dict__
+    """
+
+    def __init__(self, raw_data):
+        json_data = json.loads(raw_data)
+        for key, value in json_data.items():
+            setattr(self, key, value)
+
+
+def measure(build, payloads):
+    """Return the bytes held by the models build() makes of payloads
+    """
+    gc.collect()
+    tracemalloc.start()
+    models = [build(resource, raw_data) for resource, raw_data in payloads]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del models
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default=settings.FIXTURES_PATH)
+    args = parser.parse_args(argv)
+
+    set_cache(None)
+    with StandIn(load_fixtures(args.fixtures)) as server:
+        catalog = crawl(server.base_url)
+    payloads = [
+        (resource, json.dumps(json_data).encode())
+        for resource, resources in catalog.items() for json_data in resources
+    ]
+    print(f"{len(payloads)} resources, {sum(len(raw) for _, raw in payloads)} bytes of JSON")
+
+    sizes = {
+        "dict models": measure(lambda resource, raw_data: DictModel(raw_data), payloads),
+        "slot models": measure(lambda resource, raw_data: MODELS[resource](raw_data), payloads),
+    }
+    for name, size in sizes.items():
+        print(f"{name}: {size / 1024:.0f} kB, {size / len(payloads):.0f} bytes per model")
+    print(f"saved {1 - sizes['slot models'] / sizes['dict models']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
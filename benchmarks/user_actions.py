@@ -0,0 +1,103 @@
+"""Time the database work of the CLI actions on Users and Favorites
+
+    python benchmarks/user_actions.py --calls 300
+
+The actions run on a temporary copy of db/db_StarFilm.db, never on the
+database itself. Each one is timed with the shared engine of
+starfilm.models, and with a new engine per action, as when every Users()
+built its own engine.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+
+from starfilm import models
+from starfilm.models import Favorites, Session, Users
+
+ACTIONS = {
+    "get_favorites": lambda: Users.get_favorites("client"),
+    "admin login": lambda: Users.authenticate("admin", "admin") and Users.is_admin("admin"),
+    "list_all_users": Users.list_all_users,
+    "get_fav_stats": Favorites.get_fav_stats,
+    "add + remove favorite": lambda: (
+        Users.add_favorites("client", [6]), Users.remove_favorites("client", [6])
+    ),
+}
+
+
+def make_engine(url):
+    """Return an engine on url configured like the one of starfilm.models
+    """
+    engine = create_engine(
+        url,
+        pool_size=models.DB_POOL_SIZE,
+        max_overflow=models.DB_MAX_OVERFLOW,
+        pool_timeout=models.DB_POOL_TIMEOUT,
+        connect_args={"check_same_thread": False},
+    )
+    event.listen(engine, "connect", models._on_connect)
+    event.listen(engine, "begin", models._on_begin)
+    return engine
+
+
+def copy_database(directory):
+    """Copy the project database into directory and return its SQLAlchemy url
+    """
+    path = os.path.join(directory, "db_StarFilm.db")
+    source = sqlite3.connect("file:{0}?mode=ro".format(models.engine.url.database), uri=True)
+    target = sqlite3.connect(path)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+    return "sqlite:///" + path
+
+
+def mean_time(action, calls, after_call=None):
+    """Return the mean seconds of a call of action, after_call() running untimed
+    """
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - start)
+        if after_call:
+            after_call()
+    return statistics.mean(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = copy_database(directory)
+        shared_engine = make_engine(url)
+        try:
+            for name, action in ACTIONS.items():
+                Session.configure(bind=shared_engine)
+                action()  # Opens the pooled connection
+                shared = mean_time(action, args.calls)
+
+                def with_fresh_engine():
+                    Session.configure(bind=create_engine(url))
+                    action()
+                # Dispose of each engine untimed, or their connections pile up
+                fresh = mean_time(with_fresh_engine, args.calls, lambda: Session.kw["bind"].dispose())
+                print(f"{name:22} shared engine {shared * 1e6:6.0f} us   engine per action {fresh * 1e6:6.0f} us")
+        finally:
+            Session.configure(bind=models.engine)
+            shared_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
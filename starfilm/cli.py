@@ -1,11 +1,16 @@
 import os
+import threading
+import time
+from concurrent.futures import Future
 from rich.console import Console
+from rich.live import Live
 from rich.table import Table
 from rich.prompt import Confirm
 
 from .swapi import swapi
 from .utils import *
 from .models import *
+from .migrations import migrate
 
 console = Console()
 CUR_DIR = os.path.dirname(__file__)
@@ -16,11 +21,22 @@ class CliApp:
     """Command line interface for Star Film
     """
     
-    def __init__(self) -> None:
+    def __init__(self, warm_up: bool = True) -> None:
         self.logged_in = False
         self.username = ""
         self.admin = False
         
+        # Bring the database file up to the current schema, in place
+        migrate(engine)
+        
+        # Films and characters loading in the background, by resource
+        self._warm_ups: dict[str, Future] = {}
+        # Their threads, which end with the download
+        self._warm_up_threads: list[threading.Thread] = []
+        self._warm_up_cancelled = threading.Event()
+        if warm_up:
+            self._start_warm_up()
+        
         try:
             self._app_loop()
         except KeyboardInterrupt:
@@ -34,6 +50,75 @@ class CliApp:
             self.main_menu()
            
     
+    "WARM UP"
+    def _start_warm_up(self) -> None:
+        """Start loading the films and the characters on background threads
+        """
+        for resource in ('films', 'people'):
+            future = Future()
+            thread = threading.Thread(target=self._warm_up, args=(resource, future), daemon=True)
+            self._warm_ups[resource] = future
+            self._warm_up_threads.append(thread)
+            thread.start()
+    
+    def _warm_up(self, resource: str, future: Future) -> None:
+        """Load every resource of the given type, the future receiving the
+        queryset as soon as the loading starts
+
+        Args:
+            resource (str): SWAPI resource name
+            future (Future): Future receiving the queryset being loaded
+        """
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            queryset = swapi.get_all(resource)
+        except BaseException as ex:
+            future.set_exception(ex)
+            return
+        # A menu may stream the queryset from now on, sharing the download
+        future.set_result(queryset)
+        items = queryset.iter()
+        try:
+            for _ in items:
+                # Checked between the items, so at the latest after the page being downloaded
+                if self._warm_up_cancelled.is_set():
+                    break
+        except Exception:
+            # Fetched again, and reported, by the menu listing it
+            pass
+        finally:
+            # Cancels the pages not requested yet, a menu streaming it takes over
+            items.close()
+    
+    def _warmed_up(self, resource: str):
+        """Take the queryset of the background loading of the given resource, if any.
+        It may still be loading, its items then arrive as they are downloaded
+
+        Args:
+            resource (str): SWAPI resource name
+
+        Returns:
+            BaseQuerySet | None: The queryset, None if there was no warm up or it failed
+        """
+        future = self._warm_ups.pop(resource, None)
+        if future is None or self._warm_up_cancelled.is_set():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+    
+    def _cancel_warm_up(self) -> None:
+        """Stop the background loadings still running, once their current page is in
+        """
+        self._warm_up_cancelled.set()
+        for future in self._warm_ups.values():
+            # Only stops the threads not started yet, the others check the event
+            future.cancel()
+        self._warm_ups.clear()
+           
+    
     "MENUS FUNCTIONS"
     def show_menu(self, title: str, choices: list[tuple] | None) -> None:
         """Show the given menu and choices
@@ -74,6 +159,36 @@ class CliApp:
             Any: returns of the called function
         """        
         return choices[choice-1][1](*args, **kwargs)
+    
+    def live_table(self, queryset, columns: list[str], row: callable, sort_key: str) -> None:
+        """Print a table of the queryset, sorted by an attribute.
+        If the queryset is not loaded yet, the rows show up as the pages
+        arrive, and the table is sorted once they all did.
+
+        Args:
+            queryset (BaseQuerySet): Queryset to list
+            columns (list[str]): Table headers
+            row (callable): Function giving the cells of a model
+            sort_key (str): Attribute to sort the rows by
+        """
+        
+        def make_table(items) -> Table:
+            table = Table(header_style="magenta")
+            for column in columns:
+                table.add_column(column)
+            for item in items:
+                table.add_row(*row(item))
+            return table
+        
+        if queryset.is_loaded():
+            console.print(make_table(queryset.order_by(sort_key)))
+            return
+        
+        table = make_table([])
+        with Live(table, console=console, refresh_per_second=10) as live:
+            for item in queryset.iter():
+                table.add_row(*row(item))
+            live.update(make_table(queryset.order_by(sort_key)))
         
 
     
@@ -86,6 +201,7 @@ class CliApp:
             menu_choices = [
                 ("Films menu", self.films_menu),
                 ("Characters menu", self.characters_menu),
+                ("Search", self.search_menu),
                 ("Admin menu", self.admin_menu),
                 ("Authentification", self.auth_menu),
                 ("Credits", self.credits_menu),
@@ -95,6 +211,7 @@ class CliApp:
             menu_choices = [
                 ("Films menu", self.films_menu),
                 ("Characters menu", self.characters_menu),
+                ("Search", self.search_menu),
                 ("Authentification", self.auth_menu),
                 ("Credits", self.credits_menu),
                 ("Quit", self.quit),
@@ -129,14 +246,14 @@ class CliApp:
                 ("Remove favorite", self.remove_favorite),
                 ("Clear screen", clear_screen),
                 ("Main menu", self.quit_menu),
-                ("[dim italic]Refresh episodes[/dim italic]", self._load_films),
+                ("[dim italic]Refresh episodes[/dim italic]", self._refresh_films),
             ]
         else:
             menu_choices = [
                 ("Show all episodes", self.list_episodes),
                 ("Clear screen", clear_screen),
                 ("Main menu", self.quit_menu),
-                ("[dim italic]Refresh episodes[/dim italic]", self._load_films),
+                ("[dim italic]Refresh episodes[/dim italic]", self._refresh_films),
             ]
             
         
@@ -157,22 +274,27 @@ class CliApp:
         """List all the episode
         """
         
-        episodes_table = Table(header_style="magenta")
-        episodes_table.add_column("ID")
-        episodes_table.add_column("Title")
-        episodes_table.add_column("Director")
-        episodes_table.add_column("Release date")
-                
-        for film in self.episodes.order_by('episode_id'):
-            episodes_table.add_row(str(film.episode_id), film.title, film.director, film.release_date)
-            
-        console.print(episodes_table)
+        self.live_table(
+            self.episodes, ["ID", "Title", "Director", "Release date"],
+            lambda film: (str(film.episode_id), film.title, film.director, str(film.release_date)),
+            'episode_id',
+        )
     
     def _load_films(self, show_done: bool = True) -> None:
         with console.status("[green]Loading episodes...[/green]") as status:
-            self.episodes = swapi.get_all('films')
+            self.episodes = self._warmed_up('films')
+            # Not tested for truth: len() of a queryset would fetch its first page
+            if self.episodes is None:
+                self.episodes = swapi.get_all('films')
             if show_done:
-                console.print("Done", style="green")
+                console.print(f"Done, {self.episodes.count()} episodes", style="green")
+    
+    def _refresh_films(self) -> None:
+        """Update the loaded episodes, only downloading the new and changed ones
+        """
+        with console.status("[green]Refreshing episodes...[/green]") as status:
+            report = self.episodes.refresh_changed()
+            console.print(f"Done: {report}", style="green")
     
     def list_favorites(self) -> None:
         if not self.logged_in:
@@ -186,11 +308,10 @@ class CliApp:
         episodes_table.add_column("Release date")
         
         with console.status("Loading favorites...") as status:
-            favorites = Users().get_favorites(self.username)
+            favorites = Users.get_favorites(self.username)
 
-            for episode in self.episodes.order_by('episode_id'):
-                if episode.episode_id in favorites:
-                    episodes_table.add_row(f"{episode.episode_id}", episode.title, episode.director, episode.release_date) 
+            for episode in self.episodes.filter(episode_id__in=favorites).order_by('episode_id'):
+                episodes_table.add_row(f"{episode.episode_id}", episode.title, episode.director, str(episode.release_date))
             
             
         console.print(episodes_table)
@@ -200,17 +321,16 @@ class CliApp:
         choice = prompt.ask_episode_id([str(e.episode_id) for e in self.episodes.items])
         
         with console.status("Loadind episode infos...") as status:
-            for episode in self.episodes.items:
-                if episode.episode_id == choice:
-                    console.print(f"\nEpisode {episode.episode_id}: \"{episode.title}\" by {episode.director}", highlight=False)
-                    break
+            episode = self.episodes.filter(episode_id=choice).first()
+            if episode:
+                console.print(f"\nEpisode {episode.episode_id}: \"{episode.title}\" by {episode.director}", highlight=False)
                 
         if Confirm.ask("[green]Add to favorite?"):
-            Users().add_favorite(self.username, choice)
+            Users.add_favorite(self.username, choice)
         
     def remove_favorite(self) -> None:
         console.print("[red]Remove Favorite")
-        fav_list = Users().get_favorites(self.username)
+        fav_list = Users.get_favorites(self.username)
         
         if not fav_list:
             console.print("[red]You have no favorites!")
@@ -218,13 +338,12 @@ class CliApp:
         
         choice = prompt.ask_episode_id([str(i) for i in fav_list]) 
         with console.status("Loadind episode infos...") as status:
-            for episode in self.episodes.items:
-                if episode.episode_id == choice:
-                    console.print(f"\nEpisode {episode.episode_id}: \"{episode.title}\" by {episode.director}", highlight=False)
-                    break
+            episode = self.episodes.filter(episode_id=choice).first()
+            if episode:
+                console.print(f"\nEpisode {episode.episode_id}: \"{episode.title}\" by {episode.director}", highlight=False)
         
         if Confirm.ask("[red]Remove of favorite?"):
-            Users().del_favorites(self.username, choice)
+            Users.del_favorites(self.username, choice)
     
     
     "CHARACTERS MENU"
@@ -244,7 +363,7 @@ class CliApp:
             ("Show all characters", self.list_characters),
             ("Clear screen", clear_screen),
             ("Main menu", self.quit_menu),
-            ("[dim italic]Refresh characters[/dim italic]", self._load_characters),
+            ("[dim italic]Refresh characters[/dim italic]", self._refresh_characters),
         ]
             
         
@@ -265,28 +384,65 @@ class CliApp:
         """List all the episode
         """
         
-        characters_table = Table(header_style="magenta")
-        characters_table.add_column("ID")
-        characters_table.add_column("Name")
-        characters_table.add_column("Gender")
-                
-        char_list = []
-        for char in self.characters.order_by('url'):
-            char_list.append((int(char.url.split('/')[-2]), char.name, char.gender))
-            
-        char_list.sort(key=lambda key: key[0])
-        for char in char_list:
-            characters_table.add_row(f"{char[0]}", f"{char[1]}", f"{char[2]}")
-            
-        console.print(characters_table)
+        self.live_table(
+            self.characters, ["ID", "Name", "Gender"],
+            lambda char: (f"{char.id}", f"{char.name}", f"{char.gender}"),
+            'id',
+        )
     
     def _load_characters(self, show_done: bool = True) -> None:
         with console.status("[green]Loading characters...[/green]") as status:
-            self.characters = swapi.get_all('people')
+            self.characters = self._warmed_up('people')
+            if self.characters is None:
+                self.characters = swapi.get_all('people')
             if show_done:
-                console.print("Done", style="green")
+                console.print(f"Done, {self.characters.count()} characters", style="green")
+    
+    def _refresh_characters(self) -> None:
+        """Update the loaded characters, only downloading the new and changed ones
+        """
+        with console.status("[green]Refreshing characters...[/green]") as status:
+            report = self.characters.refresh_changed()
+            console.print(f"Done: {report}", style="green")
     
     
+    "SEARCH MENU"
+    def search_menu(self) -> None:
+        """Search the films, characters, planets, species, starships and vehicles
+        loaded so far, until an empty search
+        """
+        
+        self.show_menu('SEARCH', None)
+        
+        # Let the background loading index the films and the characters first.
+        # Its futures resolve when the download starts, its threads end with it
+        if any(thread.is_alive() for thread in self._warm_up_threads):
+            with console.status("[green]Indexing...[/green]") as status:
+                for thread in self._warm_up_threads:
+                    thread.join()
+        
+        while True:
+            text = prompt.ask_search()
+            if not text.strip():
+                return
+            
+            start = time.perf_counter()
+            results = swapi.search(text, limit=20)
+            elapsed = (time.perf_counter() - start) * 1000
+            
+            if not results:
+                console.print(f"No results ({elapsed:.2f} ms)", style="red")
+                continue
+            
+            results_table = Table(header_style="magenta")
+            results_table.add_column("Type")
+            results_table.add_column("ID")
+            results_table.add_column("Name")
+            for model in results:
+                results_table.add_row(model.resource, str(model.id), str(getattr(model, model.SEARCH_FIELDS[0])))
+            console.print(results_table)
+            console.print(f"{len(results)} results ({elapsed:.2f} ms)", style="green")
+    
     
     "AUTH MENU"
     def auth_menu(self):
@@ -324,7 +480,7 @@ class CliApp:
         username = prompt.ask_username()
         password = prompt.ask_password()
         
-        if Users().authenticate(username, password) and Users().is_admin(username):
+        if Users.authenticate(username, password) and Users.is_admin(username):
             self.logged_in = True
             self.username = username
             self.admin = True
@@ -340,7 +496,7 @@ class CliApp:
         username = prompt.ask_username()
         password = prompt.ask_password()
         
-        if Users().authenticate(username, password):
+        if Users.authenticate(username, password):
             self.logged_in = True
             self.username = username
             display.login_success()
@@ -379,6 +535,8 @@ class CliApp:
             ("Show fav stats", self.fav_stats),
             ("List all users", self.list_users),
             ("Get user's favorites", self.list_users_favorites),
+            ("Snapshot SWAPI catalog", self.snapshot_catalog),
+            ("Verify favorite counters", self.verify_fav_counts),
             ("Clear screen", clear_screen),
             ("Main menu", self.quit_menu),
         ]
@@ -402,7 +560,7 @@ class CliApp:
         except:
             self._load_films(False)
             
-        fav_list = Favorites.get_fav_stats()
+        fav_list = Favorites.top_favorites()
         
         table = Table(header_style="magenta")
         table.add_column('Count Fav')
@@ -411,14 +569,12 @@ class CliApp:
         table.add_column('Director')
         table.add_column('Release date')
         
+        # Already sorted by favorite count
         films_list = []            
-        for key, value in fav_list.items():
-            for episode in self.episodes.items:
-                if episode.episode_id == key:
-                    film = episode
-                    films_list.append((value, key, episode.title, episode.director, episode.release_date))
-                    
-        films_list.sort(key=lambda key: key[0], reverse=True)
+        for key, value in fav_list:
+            episode = self.episodes.filter(episode_id=key).first()
+            if episode:
+                films_list.append((value, key, episode.title, episode.director, str(episode.release_date)))
         
         for film in films_list:
             table.add_row(f"{film[0]}", f"{film[1]}", f"{film[2]}", f"{film[3]}", f"{film[4]}")
@@ -433,7 +589,7 @@ class CliApp:
         user_table.add_column("ID")
         user_table.add_column("Username")
                 
-        for user in Users().list_all_users():
+        for user in Users.list_all_users():
             user_table.add_row(str(user[0]), user[1])
             
         console.print(user_table)
@@ -449,7 +605,7 @@ class CliApp:
         
         target = Prompt.ask("Target user wanted")
         
-        all_username = [user[1] for user in Users().list_all_users()]
+        all_username = [user[1] for user in Users.list_all_users()]
         if not target in all_username:
             console.print("[red]User not found", style="red")
             return
@@ -463,15 +619,57 @@ class CliApp:
         
         
         with console.status("Loading favorites...") as status:
-            favorites = Users().get_favorites(target)
+            favorites = Users.get_favorites(target)
 
-            for episode in self.episodes.order_by('episode_id'):
-                if episode.episode_id in favorites:
-                    episodes_table.add_row(f"{episode.episode_id}", episode.title, episode.director, episode.release_date) 
+            for episode in self.episodes.filter(episode_id__in=favorites).order_by('episode_id'):
+                episodes_table.add_row(f"{episode.episode_id}", episode.title, episode.director, str(episode.release_date))
             
             
         console.print(episodes_table)
 
+    def snapshot_catalog(self) -> None:
+        """Copy the whole SWAPI catalog into the local database mirror
+        """
+        
+        with console.status("[green]Downloading the SWAPI catalog...[/green]") as status:
+            counts = swapi.snapshot()
+        
+        table = Table(header_style="magenta")
+        table.add_column("Resource")
+        table.add_column("Count")
+        
+        for resource, count in counts.items():
+            table.add_row(resource, str(count))
+            
+        console.print(table)
+        console.print("Set STARFILM_BACKEND=mirror to read the catalog from the database", style="dim italic")
+
+    def verify_fav_counts(self) -> None:
+        """Check the favorite counter of each episode against a recount, and offer to rebuild the wrong ones
+        """
+        
+        with console.status("[green]Recounting favorites...[/green]") as status:
+            mismatches = Favorites.verify_counts()
+        
+        if mismatches is None:
+            console.print("Could not verify the favorite counters", style="red")
+            return
+        if not mismatches:
+            console.print("All favorite counters are right", style="green")
+            return
+        
+        table = Table(header_style="magenta")
+        table.add_column("ID")
+        table.add_column("Stored")
+        table.add_column("Actual")
+        for episode_id, (stored, actual) in sorted(mismatches.items()):
+            table.add_row(str(episode_id), str(stored), str(actual))
+        console.print(table)
+        
+        if Confirm.ask("Rebuild the favorite counters?"):
+            fixed = Favorites.rebuild_counts()
+            console.print(f"Done, {fixed} counters fixed", style="green")
+
     
     "CREDITS MENU"
     def credits_menu(self) -> None:
@@ -521,5 +719,6 @@ class CliApp:
     def quit(self, on_newline: bool = False):
         """Exit the program
         """
+        self._cancel_warm_up()
         display.goodbye(on_newline)
         quit()
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""Versioned schema migrations of db_StarFilm.db
+
+The version of a database file is its SQLite user_version. migrate()
+applies, in order and each in its own transaction, the MIGRATIONS newer
+than that version, so the shipped database and the copies already in use
+are upgraded in place.
+
+To change the schema, append a migration with the next version number;
+never edit one that was released.
+"""
+
+MIGRATIONS = [
+    (
+        1,
+        "One row per (user, episode) and per (user, role)",
+        [
+            """DELETE FROM user_has_favorite WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM user_has_favorite GROUP BY idUser, idEpisode
+            )""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS user_has_favorite_user_episode
+                ON user_has_favorite (idUser, idEpisode)""",
+            """DELETE FROM user_has_role WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM user_has_role GROUP BY idUser, IdRole
+            )""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS user_has_role_user_role
+                ON user_has_role (idUser, IdRole)""",
+        ],
+    ),
+    (
+        2,
+        "Covering indexes for the lookups by episode and by role",
+        [
+            """CREATE INDEX IF NOT EXISTS user_has_favorite_episode_user
+                ON user_has_favorite (idEpisode, idUser)""",
+            """CREATE INDEX IF NOT EXISTS user_has_role_role_user
+                ON user_has_role (IdRole, idUser)""",
+        ],
+    ),
+    (
+        3,
+        "Favorite count of each episode, kept up to date by triggers",
+        [
+            """ALTER TABLE Favorites ADD COLUMN favorite_count INTEGER NOT NULL DEFAULT 0""",
+            """UPDATE Favorites SET favorite_count = (
+                SELECT COUNT(*) FROM user_has_favorite
+                WHERE user_has_favorite.idEpisode = Favorites.idEpisode
+            )""",
+            """CREATE INDEX IF NOT EXISTS Favorites_favorite_count
+                ON Favorites (favorite_count DESC, idEpisode)""",
+            """CREATE TRIGGER IF NOT EXISTS user_has_favorite_count_insert
+                AFTER INSERT ON user_has_favorite
+            BEGIN
+                UPDATE Favorites SET favorite_count = favorite_count + 1
+                WHERE idEpisode = NEW.idEpisode;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS user_has_favorite_count_delete
+                AFTER DELETE ON user_has_favorite
+            BEGIN
+                UPDATE Favorites SET favorite_count = favorite_count - 1
+                WHERE idEpisode = OLD.idEpisode;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS user_has_favorite_count_update
+                AFTER UPDATE OF idEpisode ON user_has_favorite
+            BEGIN
+                UPDATE Favorites SET favorite_count = favorite_count - 1
+                WHERE idEpisode = OLD.idEpisode;
+                UPDATE Favorites SET favorite_count = favorite_count + 1
+                WHERE idEpisode = NEW.idEpisode;
+            END""",
+        ],
+    ),
+]
+
+
+def schema_version(connection) -> int:
+    """Return the schema version of a database
+
+    Args:
+        connection (sqlite3.Connection): DBAPI connection to the database
+
+    Returns:
+        int: the number of the last migration applied, 0 if none
+    """
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(engine, target: int | None = None) -> list[int]:
+    """Apply the pending migrations to the database of an engine
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the database
+        target (int | None, optional): Version to stop at. Defaults to the last one.
+
+    Returns:
+        list[int]: the versions applied, in order
+    """
+    applied = []
+    connection = engine.raw_connection()
+    try:
+        sqlite_connection = connection.driver_connection
+        # Handle the transactions here, DDL included
+        isolation_level = sqlite_connection.isolation_level
+        sqlite_connection.isolation_level = None
+        try:
+            for version, description, statements in MIGRATIONS:
+                if target is not None and version > target:
+                    break
+                cursor = sqlite_connection.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    # Checked inside the transaction, another process may have migrated meanwhile
+                    if schema_version(sqlite_connection) >= version:
+                        cursor.execute("ROLLBACK")
+                        continue
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute(f"PRAGMA user_version = {int(version)}")
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+                applied.append(version)
+        finally:
+            sqlite_connection.isolation_level = isolation_level
+    finally:
+        connection.close()
+    return applied
@@ -1,22 +1,124 @@
 import os
-from sqlalchemy import Column, ForeignKey, Integer, String, create_engine, select, insert, func
+import random
+import time
+from contextlib import contextmanager
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine, event, select, insert, update, delete, func, true
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 
 CUR_DIR = os.path.dirname(__file__)
 ROOT_DIR = os.path.dirname(CUR_DIR)
 
 db_path = r'sqlite:///' + os.path.join(ROOT_DIR, r'db/db_StarFilm.db')
-engine = create_engine(db_path)
+
+# Connection pool: connections stay open between the actions of the CLI
+DB_POOL_SIZE = 5        # Connections kept open
+DB_MAX_OVERFLOW = 5     # Extra connections opened under load, closed once returned
+DB_POOL_TIMEOUT = 30    # Seconds to wait for a free connection
+
+# SQLite profile, applied to every new connection
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",          # Readers don't block the writer, nor the writer the readers
+    "synchronous": "NORMAL",        # Safe with WAL: fsync at checkpoints, not at each commit
+    "busy_timeout": 5000,           # Milliseconds to wait for a lock before SQLITE_BUSY
+    "mmap_size": 64 * 1024 * 1024,  # Bytes of the file read through memory mapping
+    "cache_size": -16 * 1024,       # Page cache, in KiB when negative
+    "temp_store": "MEMORY",         # Temporary tables and indexes in memory
+}
+
+# Write transactions still answered SQLITE_BUSY after busy_timeout are retried
+DB_BUSY_RETRIES = 5
+DB_BUSY_BACKOFF = 0.05  # Seconds, doubled at each retry, with jitter
+
+# One engine and one session factory for the whole process
+engine = create_engine(
+    db_path,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    # Pooled connections may be used by another thread than the one which opened them
+    connect_args={"check_same_thread": False},
+)
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+    # Let _on_begin emit the BEGIN instead of the sqlite3 module
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _on_begin(connection):
+    # Write transactions take the write lock upfront: a deferred transaction
+    # upgrading from read to write can fail with SQLITE_BUSY without waiting
+    mode = connection.get_execution_options().get("sqlite_begin", "DEFERRED")
+    connection.exec_driver_sql(f"BEGIN {mode}")
+
+
+@contextmanager
+def session_scope(write: bool = False):
+    """Open a session for a unit of work: committed if it succeeds, rolled back
+    if it raises, and closed in any case, giving its connection back to the pool.
+
+    Args:
+        write (bool, optional): Take the write lock when the transaction begins. Defaults to False.
+
+    Yields:
+        Session: the session
+    """
+    session = Session()
+    if write:
+        session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _is_busy(ex: OperationalError) -> bool:
+    code = getattr(ex.orig, "sqlite_errorcode", None)
+    if code is not None:
+        # SQLITE_BUSY and SQLITE_LOCKED, with their extended codes
+        return code & 0xff in (5, 6)
+    return "locked" in str(ex.orig) or "busy" in str(ex.orig)
+
+
+def run_write(work):
+    """Run work(session) in a write transaction, retried with a jittered
+    backoff while the database stays busy.
+
+    Args:
+        work (callable): Function of the session doing the writes
+
+    Returns:
+        Any: returns of work
+    """
+    for attempt in range(DB_BUSY_RETRIES + 1):
+        try:
+            with session_scope(write=True) as session:
+                return work(session)
+        except OperationalError as ex:
+            if not _is_busy(ex) or attempt == DB_BUSY_RETRIES:
+                raise
+            time.sleep(random.uniform(0, DB_BUSY_BACKOFF * 2 ** attempt))
+
 
 Base = declarative_base()
 
 class Users(Base):
+    """User accounts. The queries are class methods: Users.get_favorites("client")
+    """
     __tablename__ = "Users"
 
-    def __init__(self):
-        db_path = r'sqlite:///' + os.path.join(ROOT_DIR, r'db/db_StarFilm.db')
-        self.engine = create_engine(db_path)
-
     idUser = Column(Integer, primary_key=True)
     username = Column(String(100), nullable=False, unique=True)
     password = Column(String(300), nullable=False)
@@ -27,10 +129,8 @@ class Users(Base):
     def __repr__(self):
         return f"Users(idUser={self.idUser!r}, username={self.username!r})"
     
-    def is_admin(self, username):
-
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+    @classmethod
+    def is_admin(cls, username):
 
         try:
             stmt = (
@@ -42,9 +142,10 @@ class Users(Base):
             
             list_role = []
             
-            result = session.execute(stmt)
-            for role in result:
-                list_role.append(role[0])
+            with session_scope() as session:
+                result = session.execute(stmt)
+                for role in result:
+                    list_role.append(role[0])
                 
             return 'admin' in list_role
         
@@ -52,7 +153,8 @@ class Users(Base):
             print(ex)
             return None
     
-    def get_favorites(self, username): 
+    @classmethod
+    def get_favorites(cls, username): 
         """Liste tous les favoris de l'utilisateur
 
         Args:
@@ -62,9 +164,6 @@ class Users(Base):
             string: liste des Favoris
         """
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-
         try:
             stmt = (
                 select(Favorites.idEpisode)
@@ -75,9 +174,10 @@ class Users(Base):
             
             list_fav = []
             
-            result = session.execute(stmt)
-            for fav in result:
-                list_fav.append(fav[0])
+            with session_scope() as session:
+                result = session.execute(stmt)
+                for fav in result:
+                    list_fav.append(fav[0])
                 
             return list_fav
         
@@ -85,72 +185,115 @@ class Users(Base):
             print(ex)
             return None
 
-    def add_favorite(self, username, episode_id):
-        """Ajoute un épisode aux favoris de l'utilisateur et met à jour les tables Favorites et user_has_favorite.
+    @classmethod
+    def add_favorites(cls, username, episode_ids):
+        """Ajoute des épisodes aux favoris de l'utilisateur, en une seule requête.
+        Les épisodes déjà favoris ou inconnus de la table Favorites sont ignorés.
 
         Args:
-            username (string): ...
-            episode_id (int): ...
+            username (str): ...
+            episode_ids (Iterable[int]): ...
+
+        Returns:
+            list[int]: les épisodes réellement ajoutés, None en cas d'erreur
         """
         
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
+        episode_ids = set(episode_ids)
+        if not episode_ids:
+            return []
+        
+        already_favorite = (
+            select(user_has_favorite.idEpisode)
+            .where(user_has_favorite.idUser == Users.idUser)
+            .where(user_has_favorite.idEpisode == Favorites.idEpisode)
+            .exists()
+        )
+        stmt = (
+            insert(user_has_favorite)
+            .from_select(
+                ["idUser", "idEpisode"],
+                select(Users.idUser, Favorites.idEpisode)
+                .join(Favorites, true())
+                .where(Users.username == username)
+                .where(Favorites.idEpisode.in_(episode_ids))
+                .where(~already_favorite)
+            )
+            .returning(user_has_favorite.idEpisode)
+        )
         
         try:
-            user = session.query(Users).filter(Users.username == username).first()
-            if user:
-                if episode_id in [favorite.idEpisode for favorite in user.favorites]:
-                    print("Cet épisode est déjà dans vos favoris.")
-                    return
-                
-                new_favorite = Favorites(idEpisode=episode_id)
-                                
-                    # # Ajoute l'épisode aux favoris
-                    # new_favorite = Favorites(idEpisode=episode_id)
-                    # session.add(new_favorite)
-                
-                # Met à jour les tables user_has_favorite et Favorites
-                uhf = user_has_favorite(idUser=user.idUser, idEpisode=episode_id)
-                session.add(uhf)
-                
-                session.commit()
-                
-                print(f"L'épisode : {episode_id} a été ajouté aux favoris de l'utilisateur {username}.")
-            else:
-                print("Vous devez être connecté pour ajouter aux favoris.")
-            
+            added = run_write(lambda session: session.execute(stmt).scalars().all())
+            return sorted(set(added))
+        
         except Exception as ex:
-            session.rollback()
-            print(f"Une erreur s'est produite lors de l'ajout du favori : {ex}")
-            
-    def del_favorites(self, username, episode_id):
-        """Supprime un favori de l'utilisateur.
+            print(f"Une erreur s'est produite lors de l'ajout des favoris : {ex}")
+            return None
+
+    @classmethod
+    def remove_favorites(cls, username, episode_ids):
+        """Retire des épisodes des favoris de l'utilisateur, en une seule requête.
+
+        Args:
+            username (str): ...
+            episode_ids (Iterable[int]): ...
+
+        Returns:
+            list[int]: les épisodes réellement retirés, None en cas d'erreur
+        """
+        
+        episode_ids = set(episode_ids)
+        if not episode_ids:
+            return []
+        
+        stmt = (
+            delete(user_has_favorite)
+            .where(user_has_favorite.idUser == (
+                select(Users.idUser).where(Users.username == username).scalar_subquery()
+            ))
+            .where(user_has_favorite.idEpisode.in_(episode_ids))
+            .returning(user_has_favorite.idEpisode)
+        )
+        
+        try:
+            removed = run_write(lambda session: session.execute(stmt).scalars().all())
+            return sorted(set(removed))
+        
+        except Exception as ex:
+            print(f"Une erreur s'est produite lors de la suppression des favoris : {ex}")
+            return None
+
+    @classmethod
+    def add_favorite(cls, username, episode_id):
+        """Ajoute un épisode aux favoris de l'utilisateur, voir add_favorites.
 
         Args:
             username (string): ...
             episode_id (int): ...
         """
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
         
-        try:
-            user = session.query(Users).filter(Users.username == username).first()
-            if user:
-                favorite_entry = session.query(user_has_favorite).filter_by(idUser=user.idUser, idEpisode=episode_id).first()
-                if favorite_entry:
-                    session.delete(favorite_entry)
-                    print(f"L'épisode : {episode_id} a été supprimée.")
-                else:
-                    print(f"Erreur dans la suppression du favoris")
-                session.commit()
-            else:
-                print(f"Vous devez être connecté pour retirer un aux favoris.")
+        added = cls.add_favorites(username, [episode_id])
+        if added:
+            print(f"L'épisode : {episode_id} a été ajouté aux favoris de l'utilisateur {username}.")
+        elif added is not None:
+            print("Cet épisode est déjà dans vos favoris.")
             
-        except Exception as ex:
-            session.rollback()
-            print(f"Une erreur s'est produite lors de la suppression du favori : {ex}")
+    @classmethod
+    def del_favorites(cls, username, episode_id):
+        """Supprime un favori de l'utilisateur, voir remove_favorites.
 
-    def authenticate(self, username, password) -> bool:
+        Args:
+            username (string): ...
+            episode_id (int): ...
+        """
+        
+        removed = cls.remove_favorites(username, [episode_id])
+        if removed:
+            print(f"L'épisode : {episode_id} a été supprimée.")
+        elif removed is not None:
+            print(f"Erreur dans la suppression du favoris")
+
+    @classmethod
+    def authenticate(cls, username, password) -> bool:
         """Vérifie si le mot de passe correspond au nom d'utilisateur
 
         Args:
@@ -158,24 +301,19 @@ class Users(Base):
             password (str):
         """
 
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
-
-        if user:=session.query(Users).filter(Users.username == username).first():
-            if user.password == password:
-                return True
-        else:
-            return False
+        with session_scope() as session:
+            user = session.query(Users).filter(Users.username == username).first()
+            return user is not None and user.password == password
     
-    def list_all_users(self):
+    @classmethod
+    def list_all_users(cls):
         
-        Session = sessionmaker(bind=self.engine)
-        session = Session()
         try: 
-            list_users = session.query(Users).all()
-            users = []
-            for user in list_users:
-                users.append((user.idUser, user.username))
+            with session_scope() as session:
+                list_users = session.query(Users).all()
+                users = []
+                for user in list_users:
+                    users.append((user.idUser, user.username))
             return users
                 
         except Exception as e: 
@@ -187,27 +325,31 @@ class Favorites(Base):
     __tablename__ = "Favorites"
     
     idEpisode = Column(Integer, primary_key=True)
+    # Number of users having the episode in their favorites, kept up to date by triggers (see migrations)
+    favorite_count = Column(Integer, nullable=False, default=0)
     
     users = relationship("Users", secondary="user_has_favorite", back_populates="favorites")        
     
     def __repr__(self):
-        return f"Favorites(idEpisode={self.idEpisode!r})"
+        return f"Favorites(idEpisode={self.idEpisode!r}, favorite_count={self.favorite_count!r})"
     
+    @staticmethod
     def get_fav_stats():
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        """Favorite count of each episode favorited at least once, read from the counters
+
+        Returns:
+            dict[int, int]: favorite count by episode id, None on error
+        """
 
         try:
-            query = (
-                session.query(
-                Favorites.idEpisode,
-                func.count(user_has_favorite.idUser))
-                .join(user_has_favorite)
-                .group_by(Favorites.idEpisode)
-                .order_by(Favorites.idEpisode.desc())
-            )
+            with session_scope() as session:
+                query = (
+                    session.query(Favorites.idEpisode, Favorites.favorite_count)
+                    .filter(Favorites.favorite_count > 0)
+                    .order_by(Favorites.idEpisode.desc())
+                )
+                results = query.all()
             dict_fav = {}
-            results = query.all()
             if results:
                 for episode_id, count_favorites in results:
                     dict_fav[episode_id] = count_favorites
@@ -215,8 +357,83 @@ class Favorites(Base):
         except Exception as ex:
             print(ex)
             return None
+    
+    @staticmethod
+    def top_favorites(n=None):
+        """Most favorited episodes first, read from the counters
+
+        Args:
+            n (int | None, optional): Number of episodes. Defaults to all the favorited ones.
+
+        Returns:
+            list[tuple[int, int]]: (episode id, favorite count), None on error
+        """
         
+        try:
+            with session_scope() as session:
+                query = (
+                    session.query(Favorites.idEpisode, Favorites.favorite_count)
+                    .filter(Favorites.favorite_count > 0)
+                    .order_by(Favorites.favorite_count.desc(), Favorites.idEpisode)
+                    .limit(n)
+                )
+                return [tuple(row) for row in query.all()]
+        except Exception as ex:
+            print(ex)
+            return None
+    
+    @staticmethod
+    def _recount():
+        return (
+            select(func.count())
+            .select_from(user_has_favorite)
+            .where(user_has_favorite.idEpisode == Favorites.idEpisode)
+            .scalar_subquery()
+        )
+    
+    @staticmethod
+    def verify_counts():
+        """Compare the favorite counters with a recount of user_has_favorite
 
+        Returns:
+            dict[int, tuple[int, int]]: (stored, actual) counts of the episodes whose counter is wrong, None on error
+        """
+        
+        recount = Favorites._recount()
+        try:
+            with session_scope() as session:
+                results = session.execute(
+                    select(Favorites.idEpisode, Favorites.favorite_count, recount)
+                    .where(Favorites.favorite_count != recount)
+                ).all()
+            return {episode_id: (stored, actual) for episode_id, stored, actual in results}
+        except Exception as ex:
+            print(ex)
+            return None
+    
+    @staticmethod
+    def rebuild_counts():
+        """Recount the favorites of every episode and fix the wrong counters
+
+        Returns:
+            int: number of counters fixed, None on error
+        """
+        
+        recount = Favorites._recount()
+        stmt = (
+            update(Favorites)
+            .where(Favorites.favorite_count != recount)
+            .values(favorite_count=recount)
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            return run_write(lambda session: session.execute(stmt).rowcount)
+        except Exception as ex:
+            print(ex)
+            return None
+        
+
+    @staticmethod
     def list_user_favorites(target_username):
         """Liste les favoris de l'utilisateur par son nom.
 
@@ -224,19 +441,17 @@ class Favorites(Base):
             session: SQLAlchemy
             target_username (str): target username 
         """
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        
         try:
-            target_user = session.query(Users).filter(Users.username == target_username).first()
-            if target_user:
-                favorites = target_user.favorites
-                user_favorites = []
-                for favorite in favorites:
-                    user_favorites.append((target_user.username, favorite.idEpisode))
-                return user_favorites
-            else:
-                print(f"L'utilisateur avec le nom d'utilisateur {target_username} n'existe pas.")
+            with session_scope() as session:
+                target_user = session.query(Users).filter(Users.username == target_username).first()
+                if target_user:
+                    favorites = target_user.favorites
+                    user_favorites = []
+                    for favorite in favorites:
+                        user_favorites.append((target_user.username, favorite.idEpisode))
+                    return user_favorites
+                else:
+                    print(f"L'utilisateur avec le nom d'utilisateur {target_username} n'existe pas.")
         except Exception as ex:
             print(f"Une erreur s'est produite lors de la récupération des favoris : {ex}")
             
@@ -267,16 +482,13 @@ if __name__ == "__main__":
     # EXEMPLE D'UTILISATION #
 
     ##### get_favorites() #######
-    # user = Users()
-    # print(user.get_favorites("test2"))
+    # print(Users.get_favorites("test2"))
     ##### add_favorites() #######
-    # user = Users()
-    # user.add_favorite("client", 1)
+    # Users.add_favorite("client", 1)
     # print(Favorites.get_fav_stats())
 
 
-    # print(user.get_favorites("test"))
+    # print(Users.get_favorites("test"))
 
     # ##### del_favorites() #######
-    # user = Users()
-    # user.del_favorites("test", 2)
\ No newline at end of file
+    # Users.del_favorites("test", 2)
\ No newline at end of file
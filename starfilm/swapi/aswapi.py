@@ -0,0 +1,344 @@
+''' Asyncio twin of swapi.py
+
+Every function is a coroutine sharing one aiohttp session per event loop,
+and the fan-out of a single call is bounded by settings.MAX_WORKERS:
+
+    films = await aswapi.get_all('films')
+    characters = await aswapi.get_related(films.items[0], 'characters')
+'''
+import asyncio
+import time
+import weakref
+
+import aiohttp
+
+try:
+    from swapi import exceptions, settings
+    from swapi.cache import CachedResponse, get_cache
+    from swapi.decoder import loads
+    from swapi.identity import identity_map, url_key
+    from swapi.mirror import get_mirror
+    from swapi.ratelimit import AsyncAdaptiveLimiter, backoff, retry_after
+    from swapi.utils import _revalidate, is_page_url, page_url, raise_for_status
+    from swapi.models import (
+        QUERYSETS,
+        People,
+        PeopleQuerySet,
+        Planet,
+        PlanetQuerySet,
+        Starship,
+        StarshipQuerySet,
+        Vehicle,
+        VehicleQuerySet,
+        Species,
+        SpeciesQuerySet,
+        Film,
+        FilmQuerySet,
+    )
+except:
+    import exceptions, settings
+    from cache import CachedResponse, get_cache
+    from decoder import loads
+    from identity import identity_map, url_key
+    from mirror import get_mirror
+    from ratelimit import AsyncAdaptiveLimiter, backoff, retry_after
+    from utils import _revalidate, is_page_url, page_url, raise_for_status
+    from models import (
+        QUERYSETS,
+        People,
+        PeopleQuerySet,
+        Planet,
+        PlanetQuerySet,
+        Starship,
+        StarshipQuerySet,
+        Vehicle,
+        VehicleQuerySet,
+        Species,
+        SpeciesQuerySet,
+        Film,
+        FilmQuerySet,
+    )
+
+
+# Queryset of every relation field found on the models
+RELATIONS = {
+    'films': FilmQuerySet,
+    'characters': PeopleQuerySet,
+    'people': PeopleQuerySet,
+    'pilots': PeopleQuerySet,
+    'residents': PeopleQuerySet,
+    'planets': PlanetQuerySet,
+    'species': SpeciesQuerySet,
+    'starships': StarshipQuerySet,
+    'vehicles': VehicleQuerySet,
+}
+
+
+class AsyncClient(object):
+    ''' Pooled aiohttp session whose requests are scheduled by an AsyncAdaptiveLimiter
+
+    429s, 5xx and connection errors are retried like in swapi.client.
+    '''
+    def __init__(self, max_workers=None, pool_maxsize=None, timeout=None, limiter=None):
+        self.max_workers = max_workers or settings.MAX_WORKERS
+        self.pool_maxsize = pool_maxsize or settings.POOL_MAXSIZE
+        self.timeout = timeout or settings.TIMEOUT
+        self.limiter = limiter or AsyncAdaptiveLimiter(max_concurrency=self.max_workers)
+        self.session = None
+
+    def __repr__(self):
+        return '<AsyncClient - {0} workers>'.format(self.max_workers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize * settings.POOL_CONNECTIONS,
+                limit_per_host=self.pool_maxsize,
+            )
+            headers = {'User-Agent': settings.USER_AGENT} if settings.USER_AGENT else None
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self.session
+
+    async def query(self, url):
+        ''' Return the decoded JSON of url, going through the response cache when it is enabled '''
+        if settings.BACKEND == 'mirror':
+            return loads(get_mirror().query(url).content)
+        cache = get_cache()
+        if cache is None:
+            return loads((await self.get(url)).content)
+
+        cached = cache.get(url)
+        if cached is None:
+            response = await self.get(url)
+            cache.set(url, response)
+            return loads(response.content)
+        if cache.is_fresh(cached):
+            return loads(cached.content)
+        if cache.stale_while_revalidate:
+            cache.revalidate_later(url, lambda url: _revalidate(cache, url, cached))
+            return loads(cached.content)
+        try:
+            response = await self.get(url, cached.validators())
+        except (aiohttp.ClientError, asyncio.TimeoutError,
+                exceptions.RateLimited, exceptions.ServerError):
+            # Offline or throttled: an outdated catalog is better than none
+            return loads(cached.content)
+        if response is None:
+            cache.touch(url)
+            return loads(cached.content)
+        cache.set(url, response)
+        return loads(response.content)
+
+    async def get(self, url, headers=None):
+        ''' GET url, retrying the transient failures, as a CachedResponse
+
+        With the validators of a cached response as headers, None is
+        returned when the server answers 304 Not Modified.
+        '''
+        for attempt in range(settings.RETRIES + 1):
+            last_attempt = attempt == settings.RETRIES
+            await self.limiter.acquire()
+            start = time.monotonic()
+            failed = True
+            try:
+                async with self._get_session().get(url, headers=headers) as response:
+                    failed = response.status in settings.RETRY_STATUSES
+                    delay = retry_after(response.headers)
+                    if response.status == 304 and headers:
+                        return None
+                    if not failed or last_attempt:
+                        raise_for_status(response.status, response.headers)
+                        return CachedResponse(
+                            url, await response.read(), response.headers.get('ETag'),
+                            response.headers.get('Last-Modified'), time.time()
+                        )
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+                delay = None
+            finally:
+                # Whatever happened, the slot goes back to the limiter
+                await self.limiter.release(time.monotonic() - start, failed)
+            if delay is None:
+                delay = backoff(attempt)
+            else:
+                await self.limiter.pause(delay)
+            await asyncio.sleep(delay)
+
+    async def fetch_all(self, urls):
+        ''' Fetch every url concurrently, see swapi.fetch.fetch_all '''
+        unique_urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(
+            *(self.query(url) for url in unique_urls), return_exceptions=True
+        )
+        resources = []
+        errors = {}
+        for url, result in zip(unique_urls, results):
+            if isinstance(result, Exception):
+                errors[url] = result
+            else:
+                resources.append(result)
+        return resources, errors
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    ''' Return the client of the running event loop, creating it on first use '''
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = AsyncClient()
+    return _clients[loop]
+
+
+async def close():
+    ''' Close the client of the running event loop '''
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def query(url):
+    return await get_client().query(url)
+
+
+async def all_resources(url):
+    ''' Get the JSON data of every resource of a list endpoint
+
+    Like utils.all_resources(), the pages after the first are fetched
+    concurrently from the count and the page size, and the next links are
+    followed when they can't be computed or don't add up.
+    '''
+    first_page = await query(url)
+    resources = list(first_page['results'])
+    if not first_page['next']:
+        return resources
+
+    page_size = len(first_page['results'])
+    count = first_page.get('count')
+    if isinstance(count, int) and page_size and is_page_url(first_page['next'], url, 2):
+        numbers = range(2, -(-count // page_size) + 1)
+        try:
+            pages = await asyncio.gather(*(query(page_url(url, n)) for n in numbers))
+        except exceptions.ResourceDoesNotExist:
+            pass
+        else:
+            for page in pages:
+                resources.extend(page['results'])
+            last_page = pages[-1] if pages else first_page
+            if len(resources) == count and not last_page['next']:
+                return resources
+
+    # Fall back to following the next links, from the first page we already have
+    resources = list(first_page['results'])
+    json_data = first_page
+    while json_data['next']:
+        json_data = await query(json_data['next'])
+        resources.extend(json_data['results'])
+    return resources
+
+
+async def _get_resource(model, url):
+    ''' Return the model of url, fetching it only if it is not loaded yet '''
+    resource = identity_map.get(url)
+    if resource is None:
+        resource = identity_map.load(model, await query(url))
+    return resource
+
+
+async def _get(model, id, type):
+    return await _get_resource(model, f"{settings.BASE_URL}/{type}/{id}/")
+
+
+async def _get_queryset(queryset_class, list_of_urls):
+    resources, errors = await get_client().fetch_all(list_of_urls)
+    queryset = queryset_class.from_results(resources)
+    queryset.errors = errors
+    return queryset
+
+
+async def get_all(resource):
+    ''' Return all of a single resource '''
+    results = await all_resources(
+        "{0}/{1}/".format(settings.BASE_URL, resource)
+    )
+    return QUERYSETS[resource].from_results(results)
+
+
+async def get_planet(planet_id):
+    ''' Return a single planet '''
+    return await _get(Planet, planet_id, settings.PLANETS)
+
+
+async def get_person(people_id):
+    ''' Return a single person '''
+    return await _get(People, people_id, settings.PEOPLE)
+
+
+async def get_starship(starship_id):
+    ''' Return a single starship '''
+    return await _get(Starship, starship_id, settings.STARSHIPS)
+
+
+async def get_vehicle(vehicle_id):
+    ''' Return a single vehicle '''
+    return await _get(Vehicle, vehicle_id, settings.VEHICLES)
+
+
+async def get_species(species_id):
+    ''' Return a single species '''
+    return await _get(Species, species_id, settings.SPECIES)
+
+
+async def get_film(film_id):
+    ''' Return a single film '''
+    return await _get(Film, film_id, settings.FILMS)
+
+
+async def get_related(resource, attribute):
+    ''' Return the queryset of a relation field of a model, e.g. get_related(film, 'characters') '''
+    return await _get_queryset(RELATIONS[attribute], getattr(resource, attribute))
+
+
+async def get_relations(resource):
+    ''' Resolve every relation field of a model at once
+
+    All the related urls are fetched in a single bounded fan-out, and a
+    dict of querysets by field is returned.
+    '''
+    attributes = [a for a in RELATIONS if isinstance(getattr(resource, a, None), list)]
+    urls = [url for a in attributes for url in getattr(resource, a)]
+    resources, errors = await get_client().fetch_all(urls)
+    # The urls of the payloads may differ from the related ones in scheme or trailing slash
+    by_url = {url_key(data['url']): data for data in resources}
+
+    relations = {}
+    for attribute in attributes:
+        related_urls = getattr(resource, attribute)
+        queryset = RELATIONS[attribute].from_results(
+            [by_url[url_key(url)] for url in related_urls if url_key(url) in by_url]
+        )
+        queryset.errors = {url: errors[url] for url in related_urls if url in errors}
+        relations[attribute] = queryset
+    return relations
+
+
+async def get_homeworld(resource):
+    ''' Return the homeworld planet of a person or a species '''
+    return await _get_resource(Planet, resource.homeworld)
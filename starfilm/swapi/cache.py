@@ -0,0 +1,229 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from swapi import settings
+except:
+    import settings
+
+
+class CachedResponse(object):
+    ''' A response served from the cache, exposing the bits of requests.Response we use '''
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, url, content, etag=None, last_modified=None, stored_at=0.0):
+        self.url = url
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.headers = {}
+        if etag:
+            self.headers['ETag'] = etag
+        if last_modified:
+            self.headers['Last-Modified'] = last_modified
+
+    def __repr__(self):
+        return '<CachedResponse - {0}>'.format(self.url)
+
+    @property
+    def age(self):
+        return time.time() - self.stored_at
+
+    def validators(self):
+        ''' Headers making a conditional request for this response '''
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    ''' SQLite store of the swapi responses, keyed by url
+
+    Entries older than ttl are revalidated with ETag/Last-Modified, and the
+    least recently used ones are evicted once max_size bytes are stored.
+    The access times of the hits are kept in memory and written touch_batch
+    at a time, or before an eviction and on close, not at every read.
+    '''
+    def __init__(self, path=None, ttl=None, max_size=None, stale_while_revalidate=None,
+                 touch_batch=None):
+        self.path = path or settings.CACHE_PATH
+        self.ttl = settings.CACHE_TTL if ttl is None else ttl
+        self.max_size = settings.CACHE_MAX_SIZE if max_size is None else max_size
+        self.stale_while_revalidate = (
+            settings.CACHE_STALE_WHILE_REVALIDATE
+            if stale_while_revalidate is None else stale_while_revalidate
+        )
+        self.touch_batch = settings.CACHE_TOUCH_BATCH if touch_batch is None else touch_batch
+        self._lock = threading.Lock()
+        self._accessed = {}
+        self._revalidating = set()
+        self._executor = None
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute(
+            '''CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )'''
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)'
+        )
+        self.connection.commit()
+
+    def __repr__(self):
+        return '<ResponseCache - {0}>'.format(self.path)
+
+    def get(self, url):
+        ''' Return the CachedResponse of url, fresh or not, or None '''
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT content, etag, last_modified, stored_at FROM responses WHERE url = ?',
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[url] = time.time()
+            if len(self._accessed) >= self.touch_batch:
+                self._write_accessed()
+                self.connection.commit()
+        return CachedResponse(url, *row)
+
+    def flush(self):
+        ''' Write the pending access times of the hits '''
+        with self._lock:
+            if self._accessed:
+                self._write_accessed()
+                self.connection.commit()
+
+    def _write_accessed(self):
+        self.connection.executemany(
+            'UPDATE responses SET accessed_at = ? WHERE url = ?',
+            [(accessed_at, url) for url, accessed_at in self._accessed.items()]
+        )
+        self._accessed.clear()
+
+    def is_fresh(self, response):
+        return response.age < self.ttl
+
+    def set(self, url, response):
+        ''' Store a 200 response and evict the oldest entries past max_size '''
+        now = time.time()
+        content = response.content
+        with self._lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, content, response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), now, now, len(content))
+            )
+            self._accessed.pop(url, None)
+            self._evict()
+            self.connection.commit()
+
+    def touch(self, url):
+        ''' Mark the entry of url as revalidated (the server answered 304) '''
+        with self._lock:
+            self.connection.execute(
+                'UPDATE responses SET stored_at = ? WHERE url = ?', (time.time(), url)
+            )
+            self.connection.commit()
+
+    def _evict(self):
+        total = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+        # The least recently used entries are found from the access times of the hits
+        self._write_accessed()
+        rows = self.connection.execute(
+            'SELECT url, size FROM responses ORDER BY accessed_at'
+        ).fetchall()
+        evicted = []
+        for url, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append((url,))
+            total -= size
+        self.connection.executemany('DELETE FROM responses WHERE url = ?', evicted)
+
+    def revalidate_later(self, url, revalidate):
+        ''' Run revalidate(url) on a background thread, once per url at a time '''
+        with self._lock:
+            if url in self._revalidating:
+                return
+            self._revalidating.add(url)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2)
+
+        def run():
+            try:
+                revalidate(url)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._revalidating.discard(url)
+
+        self._executor.submit(run)
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute('DELETE FROM responses')
+            self.connection.commit()
+            self._accessed.clear()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.flush()
+        self.connection.close()
+
+
+_UNSET = object()
+_cache = _UNSET
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    ''' Return the process-wide cache, or None when the cache is disabled '''
+    global _cache
+    if _cache is _UNSET:
+        with _cache_lock:
+            if _cache is _UNSET:
+                _cache = ResponseCache() if settings.CACHE_ENABLED else None
+    return _cache
+
+
+def set_cache(cache):
+    ''' Replace the process-wide cache, None disables it '''
+    global _cache
+    with _cache_lock:
+        if _cache not in (_UNSET, None) and _cache is not cache:
+            _cache.close()
+        _cache = cache
+    return cache
+
+
+@atexit.register
+def _flush():
+    try:
+        if _cache not in (_UNSET, None):
+            _cache.flush()
+    except Exception:
+        pass
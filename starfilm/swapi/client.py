@@ -0,0 +1,109 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from swapi import settings
+    from swapi.ratelimit import AdaptiveLimiter, backoff, retry_after
+except:
+    import settings
+    from ratelimit import AdaptiveLimiter, backoff, retry_after
+
+
+class SwapiClient(object):
+    ''' Pooled keep-alive HTTP client shared by every swapi call
+
+    Requests are scheduled by an AdaptiveLimiter, and 429s, 5xx and
+    connection errors are retried with a jittered backoff, or after the
+    delay of a Retry-After header.
+    '''
+    def __init__(self, pool_connections=None, pool_maxsize=None,
+                 pool_block=None, timeout=None, user_agent=None,
+                 retries=None, limiter=None):
+        self.pool_connections = pool_connections or settings.POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or settings.POOL_MAXSIZE
+        self.pool_block = settings.POOL_BLOCK if pool_block is None else pool_block
+        self.timeout = timeout or settings.TIMEOUT
+        self.user_agent = user_agent or settings.USER_AGENT
+        self.retries = settings.RETRIES if retries is None else retries
+        self.limiter = limiter or AdaptiveLimiter(max_concurrency=self.pool_maxsize)
+        self.session = self._make_session()
+
+    def __repr__(self):
+        return '<SwapiClient - {0} per host>'.format(self.pool_maxsize)
+
+    def _make_session(self):
+        ''' Build a requests session whose adapters keep connections alive '''
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        if self.user_agent:
+            session.headers['User-Agent'] = self.user_agent
+        return session
+
+    def get(self, url, **kwargs):
+        ''' Send a GET request through the pooled session, retrying the transient failures
+
+        Returns the last response once the retries are exhausted, whatever
+        its status, and raises the last connection error if none came back.
+        '''
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = self.session.get(url, **kwargs)
+            except BaseException as ex:
+                # Whatever is raised, the slot goes back to the limiter
+                self.limiter.release(time.monotonic() - start, failed=True)
+                transient = isinstance(ex, (requests.ConnectionError, requests.Timeout))
+                if not transient or attempt == self.retries:
+                    raise
+                time.sleep(backoff(attempt))
+                continue
+            failed = response.status_code in settings.RETRY_STATUSES
+            self.limiter.release(time.monotonic() - start, failed=failed)
+            if not failed or attempt == self.retries:
+                return response
+            delay = retry_after(response.headers)
+            if delay is None:
+                delay = backoff(attempt)
+            else:
+                self.limiter.pause(delay)
+            time.sleep(delay)
+
+    def close(self):
+        ''' Close every pooled connection '''
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    ''' Return the process-wide client, creating it on first use '''
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SwapiClient()
+    return _client
+
+
+def set_client(client):
+    ''' Replace the process-wide client, closing the previous one '''
+    global _client
+    with _client_lock:
+        if _client is not None and _client is not client:
+            _client.close()
+        _client = client
+    return client
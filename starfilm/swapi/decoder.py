@@ -0,0 +1,55 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    from swapi import settings
+except:
+    import settings
+
+
+# Every decoder takes the raw bytes of a response, no text round trip
+DECODERS = {'json': json.loads}
+if orjson is not None:
+    DECODERS['orjson'] = orjson.loads
+if msgspec is not None:
+    DECODERS['msgspec'] = msgspec.json.Decoder().decode
+
+PREFERRED = ('orjson', 'msgspec', 'json')
+
+
+def get_decoder(name=None):
+    ''' Return the decoder function of name, 'auto' being the fastest installed one '''
+    name = name or settings.JSON_DECODER
+    if name == 'auto':
+        name = next(n for n in PREFERRED if n in DECODERS)
+    if name not in DECODERS:
+        raise ValueError('JSON decoder {0!r} is not available, choose among {1}'.format(
+            name, ', '.join(DECODERS)))
+    return DECODERS[name]
+
+
+_loads = None
+
+
+def set_decoder(decoder):
+    ''' Use decoder, a name of DECODERS or a function of bytes, for every swapi response '''
+    global _loads
+    _loads = get_decoder(decoder) if isinstance(decoder, str) else decoder
+    return _loads
+
+
+def loads(data):
+    ''' Decode a JSON payload, bytes or str, with the configured decoder '''
+    global _loads
+    if _loads is None:
+        _loads = get_decoder()
+    return _loads(data)
@@ -1,2 +1,36 @@
-class ResourceDoesNotExist(Exception):
-    pass
\ No newline at end of file
+class SwapiError(Exception):
+    ''' swapi could not answer a request '''
+    def __init__(self, message=None, status_code=None):
+        self.status_code = status_code
+        super(SwapiError, self).__init__(message)
+
+
+class ResourceDoesNotExist(SwapiError):
+    pass
+
+
+class RateLimited(SwapiError):
+    ''' swapi kept answering 429 Too Many Requests, retry_after is in seconds if it said '''
+    def __init__(self, message=None, status_code=429, retry_after=None):
+        self.retry_after = retry_after
+        super(RateLimited, self).__init__(message, status_code)
+
+
+class ServerError(SwapiError):
+    ''' swapi kept answering 5xx '''
+    pass
+
+
+class FetchErrors(ResourceDoesNotExist):
+    ''' Several resources could not be fetched '''
+    def __init__(self, errors):
+        self.errors = errors
+        super(FetchErrors, self).__init__(
+            '{0} resource(s) could not be fetched: {1}'.format(
+                len(errors), ', '.join(errors))
+        )
+
+
+class MultipleResourcesReturned(Exception):
+    ''' A lookup expecting a single resource matched several '''
+    pass
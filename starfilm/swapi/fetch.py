@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from swapi import settings
+    from swapi.utils import query
+except:
+    import settings
+    from utils import query
+
+
+def fetch_all(urls, max_workers=None, revalidate=False):
+    ''' Fetch every url on a bounded thread pool
+
+    Duplicated urls are fetched once. Returns the responses in the order
+    of the urls and a dict of the errors by url, so one failing resource
+    does not discard the others. revalidate is passed to query().
+    '''
+    unique_urls = list(dict.fromkeys(urls))
+    max_workers = min(max_workers or settings.MAX_WORKERS, len(unique_urls))
+    responses = {}
+    errors = {}
+
+    def fetch(url):
+        try:
+            responses[url] = query(url, revalidate)
+        except Exception as ex:
+            errors[url] = ex
+
+    if max_workers <= 1:
+        for url in unique_urls:
+            fetch(url)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(fetch, unique_urls))
+
+    return [responses[url] for url in unique_urls if url in responses], errors
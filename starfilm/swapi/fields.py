@@ -0,0 +1,98 @@
+from array import array
+from datetime import date, datetime
+
+try:
+    from swapi import settings
+except:
+    import settings
+
+
+UNKNOWN = ('unknown', 'n/a', 'none', 'indefinite', '')
+
+
+def resource_id(url):
+    ''' Return the integer id at the end of a resource url '''
+    return int(url.rstrip('/').rsplit('/', 1)[-1])
+
+
+def resource_url(resource, id):
+    ''' Return the url of a resource from its type and its id '''
+    return '{0}/{1}/{2}/'.format(settings.BASE_URL, resource, id)
+
+
+def parse_int(value):
+    ''' "1,000" -> 1000, "unknown" -> None, anything else not numeric is kept as is '''
+    if not isinstance(value, str):
+        return value
+    if value.lower() in UNKNOWN:
+        return None
+    try:
+        return int(value.replace(',', ''))
+    except ValueError:
+        return value
+
+
+def parse_float(value):
+    if not isinstance(value, str):
+        return value
+    if value.lower() in UNKNOWN:
+        return None
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return value
+
+
+def parse_date(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return value
+
+
+def parse_datetime(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return value
+
+
+class Relation(object):
+    ''' A to-many relation stored as an array of integer ids and read as urls '''
+    def __init__(self, resource):
+        self.resource = resource
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return [resource_url(self.resource, id) for id in getattr(instance, self.slot)]
+
+    def __set__(self, instance, urls):
+        setattr(instance, self.slot, array('H', (resource_id(url) for url in urls or ())))
+
+
+class Link(object):
+    ''' A to-one relation stored as an integer id, or None, and read as a url '''
+    def __init__(self, resource):
+        self.resource = resource
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        id = getattr(instance, self.slot)
+        return None if id is None else resource_url(self.resource, id)
+
+    def __set__(self, instance, url):
+        setattr(instance, self.slot, None if url is None else resource_id(url))
@@ -0,0 +1,129 @@
+import sys
+import threading
+from collections import OrderedDict
+
+try:
+    from swapi import settings
+except:
+    import settings
+
+
+def url_key(url):
+    ''' Normalize a resource url, swapi mixes http and https and trailing slashes '''
+    key = url.split('://', 1)[-1]
+    if not key.endswith('/'):
+        key += '/'
+    return key
+
+
+def _sizeof(model):
+    ''' Rough memory footprint of a model and its attribute values '''
+    size = sys.getsizeof(model)
+    for slot in model._slots():
+        value = getattr(model, slot, None)
+        size += sys.getsizeof(value)
+        if isinstance(value, dict):
+            size += sum(sys.getsizeof(v) for v in value.values())
+    return size
+
+
+class IdentityMap(object):
+    ''' LRU map holding a single model per resource url
+
+    Models are evicted least recently used first once max_items models or
+    about max_size bytes are held.
+    '''
+    def __init__(self, max_items=None, max_size=None):
+        self.max_items = max_items or settings.IDENTITY_MAP_MAX_ITEMS
+        self.max_size = max_size or settings.IDENTITY_MAP_MAX_SIZE
+        self.size = 0
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def __repr__(self):
+        return '<IdentityMap - {0}>'.format(len(self._models))
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, url):
+        return url_key(url) in self._models
+
+    def get(self, url):
+        ''' Return the model of url, or None if it was never loaded or was evicted '''
+        key = url_key(url)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None:
+                return None
+            self._models.move_to_end(key)
+            return entry[0]
+
+    def load(self, model_class, json_data):
+        ''' Return the model of json_data['url'], updating the held one in place if any '''
+        key = url_key(json_data['url'])
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and isinstance(entry[0], model_class):
+                model = entry[0]
+                model._update(json_data)
+                self._forget(key)
+            else:
+                model = model_class(json_data)
+            self._remember(key, model)
+        self._notify(model)
+        return model
+
+    def update(self, model, json_data):
+        ''' Update model in place from json_data, hold it for its url and tell the listeners '''
+        key = url_key(json_data['url'])
+        with self._lock:
+            model._update(json_data)
+            self._forget(key)
+            self._remember(key, model)
+        self._notify(model)
+        return model
+
+    def _notify(self, model):
+        for listener in self._listeners:
+            listener(model)
+
+    def subscribe(self, listener):
+        ''' Call listener(model) whenever a model is built or updated from a payload '''
+        self._listeners.append(listener)
+
+    def add(self, model):
+        ''' Register an already built model and return the one held for its url '''
+        with self._lock:
+            held = self.get(model.url)
+            if held is not None:
+                return held
+            self._remember(url_key(model.url), model)
+            return model
+
+    def discard(self, url):
+        with self._lock:
+            self._forget(url_key(url))
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self.size = 0
+
+    def _remember(self, key, model):
+        size = _sizeof(model)
+        self._models[key] = (model, size)
+        self.size += size
+        while len(self._models) > 1 and (
+                len(self._models) > self.max_items or self.size > self.max_size):
+            _, (_, evicted_size) = self._models.popitem(last=False)
+            self.size -= evicted_size
+
+    def _forget(self, key):
+        entry = self._models.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+identity_map = IdentityMap()
@@ -0,0 +1,362 @@
+''' Offline mirror of the swapi catalog stored in the project SQLite database
+
+snapshot() crawls the six resources into swapi_<resource> tables, one
+column per scalar field, and a swapi_relations table. With settings.BACKEND = 'mirror' (or
+STARFILM_BACKEND=mirror), query() serves every swapi url from those tables,
+so get_all, the get_<resource> functions and the relation getters work
+without the network.
+'''
+import json
+import re
+import sqlite3
+import threading
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from swapi import settings
+    from swapi.decoder import loads
+    from swapi.exceptions import ResourceDoesNotExist
+    from swapi.fields import resource_url
+except:
+    import settings
+    from decoder import loads
+    from exceptions import ResourceDoesNotExist
+    from fields import resource_url
+
+
+RESOURCES = (
+    settings.FILMS,
+    settings.PEOPLE,
+    settings.PLANETS,
+    settings.SPECIES,
+    settings.STARSHIPS,
+    settings.VEHICLES,
+)
+RESOURCE_URL = re.compile(r'/({0})/(\d+)/?$'.format('|'.join(RESOURCES)))
+
+# Scalar fields of each resource, stored as columns of its table
+FIELDS = {
+    settings.FILMS: (
+        'title', 'episode_id', 'opening_crawl', 'director', 'producer', 'release_date',
+        'created', 'edited',
+    ),
+    settings.PEOPLE: (
+        'name', 'height', 'mass', 'hair_color', 'skin_color', 'eye_color', 'birth_year',
+        'gender', 'created', 'edited',
+    ),
+    settings.PLANETS: (
+        'name', 'rotation_period', 'orbital_period', 'diameter', 'climate', 'gravity',
+        'terrain', 'surface_water', 'population', 'created', 'edited',
+    ),
+    settings.SPECIES: (
+        'name', 'classification', 'designation', 'average_height', 'skin_colors',
+        'hair_colors', 'eye_colors', 'average_lifespan', 'language', 'created', 'edited',
+    ),
+    settings.STARSHIPS: (
+        'name', 'model', 'manufacturer', 'cost_in_credits', 'length', 'max_atmosphering_speed',
+        'crew', 'passengers', 'cargo_capacity', 'consumables', 'hyperdrive_rating', 'MGLT',
+        'starship_class', 'created', 'edited',
+    ),
+    settings.VEHICLES: (
+        'name', 'model', 'manufacturer', 'cost_in_credits', 'length', 'max_atmosphering_speed',
+        'crew', 'passengers', 'cargo_capacity', 'consumables', 'vehicle_class', 'created', 'edited',
+    ),
+}
+# Relation fields of each resource, stored in swapi_relations: to-many, then to-one
+RELATIONS = {
+    settings.FILMS: (('characters', 'planets', 'starships', 'vehicles', 'species'), ()),
+    settings.PEOPLE: (('films', 'species', 'starships', 'vehicles'), ('homeworld',)),
+    settings.PLANETS: (('residents', 'films'), ()),
+    settings.SPECIES: (('people', 'films'), ('homeworld',)),
+    settings.STARSHIPS: (('pilots', 'films'), ()),
+    settings.VEHICLES: (('pilots', 'films'), ()),
+}
+# The other fields are swapi strings
+COLUMN_TYPES = {'episode_id': 'INTEGER'}
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS swapi_relations (
+        resource TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        field TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        related_resource TEXT NOT NULL,
+        related_id INTEGER NOT NULL,
+        PRIMARY KEY (resource, id, field, position)
+    )''',
+    '''CREATE INDEX IF NOT EXISTS swapi_relations_related
+        ON swapi_relations (related_resource, related_id)''',
+] + [
+    # extra keeps, as JSON, the fields swapi may add that have no column
+    '''CREATE TABLE IF NOT EXISTS swapi_{0} (
+        id INTEGER PRIMARY KEY,
+        {1},
+        extra TEXT
+    )'''.format(resource, ',\n        '.join(
+        '"{0}" {1}'.format(field, COLUMN_TYPES.get(field, 'TEXT')) for field in FIELDS[resource]
+    ))
+    for resource in RESOURCES
+]
+
+
+class MirrorResponse(object):
+    ''' A response served from the mirror, exposing the bits of requests.Response we use '''
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content
+        self.headers = {}
+
+    def __repr__(self):
+        return '<MirrorResponse - {0}>'.format(self.url)
+
+
+def list_page(list_url, number, count, page_size, results):
+    ''' Shape the results of a list page as swapi serves it, or return None past the last page '''
+    if number < 1 or (number > 1 and not results):
+        return None
+    return {
+        'count': count,
+        'next': '{0}?page={1}'.format(list_url, number + 1) if number * page_size < count else None,
+        'previous': '{0}?page={1}'.format(list_url, number - 1) if number > 1 else None,
+        'results': results,
+    }
+
+
+def _parse_relation(value):
+    match = RESOURCE_URL.search(value) if isinstance(value, str) else None
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+class Mirror(object):
+    ''' Local copy of the catalog in a SQLite database '''
+    def __init__(self, path=None, page_size=None):
+        self.path = path or settings.MIRROR_PATH
+        self.page_size = page_size or settings.MIRROR_PAGE_SIZE
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+
+    def __repr__(self):
+        return '<Mirror - {0}>'.format(self.path)
+
+    def create_tables(self):
+        with self._lock:
+            upgrades = [resource for resource in RESOURCES if self._is_blob_table(resource)]
+        for resource in upgrades:
+            self._upgrade_blob_table(resource)
+        with self._lock:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+            self.connection.commit()
+
+    def _is_blob_table(self, resource):
+        columns = [row[1] for row in self.connection.execute(
+            'PRAGMA table_info(swapi_{0})'.format(resource)
+        )]
+        return 'data' in columns
+
+    def _upgrade_blob_table(self, resource):
+        ''' Move a table of the first mirrors, every field in a JSON data column, to the columns '''
+        with self._lock:
+            rows = self.connection.execute('SELECT id, data FROM swapi_{0}'.format(resource)).fetchall()
+            relations = self.connection.execute(
+                '''SELECT id, field, position, related_resource, related_id FROM swapi_relations
+                   WHERE resource = ? ORDER BY id, field, position''', (resource,)
+            ).fetchall()
+            self.connection.execute('DROP TABLE swapi_{0}'.format(resource))
+            self.connection.execute(SCHEMA[2 + RESOURCES.index(resource)])
+        resources = {}
+        for id, data in rows:
+            data = loads(data)
+            data['url'] = resource_url(resource, id)
+            resources[id] = data
+        for id, field, position, related_resource, related_id in relations:
+            if id in resources:
+                url = resource_url(related_resource, related_id)
+                if position < 0:
+                    resources[id][field] = url
+                else:
+                    resources[id][field].append(url)
+        self.store(resource, resources.values())
+
+    def resources(self):
+        ''' Return the resource types that have a table in the mirror '''
+        tables = {row[0] for row in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )}
+        return [resource for resource in RESOURCES if 'swapi_' + resource in tables]
+
+    def is_empty(self):
+        with self._lock:
+            try:
+                return not self.connection.execute('SELECT 1 FROM swapi_films LIMIT 1').fetchone()
+            except sqlite3.OperationalError:
+                return True
+
+    def store(self, resource, resources):
+        ''' Insert or replace resources (decoded JSON) of a resource type '''
+        fields = FIELDS[resource]
+        rows = []
+        relations = []
+        for data in resources:
+            id = _parse_relation(data['url'])[1]
+            columns = dict.fromkeys(fields)
+            extra = {}
+            for key, value in data.items():
+                if key == 'url':
+                    continue
+                if isinstance(value, list) and value and all(map(_parse_relation, value)):
+                    for position, url in enumerate(value):
+                        relations.append((resource, id, key, position) + _parse_relation(url))
+                elif _parse_relation(value):
+                    relations.append((resource, id, key, -1) + _parse_relation(value))
+                elif key in columns:
+                    columns[key] = value
+                elif key not in RELATIONS[resource][0] + RELATIONS[resource][1]:
+                    extra[key] = value
+            rows.append((id,) + tuple(columns.values()) + (json.dumps(extra) if extra else None,))
+
+        with self._lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO swapi_{0} VALUES ({1})'.format(
+                    resource, ', '.join('?' * (len(fields) + 2))), rows
+            )
+            self.connection.executemany(
+                'DELETE FROM swapi_relations WHERE resource = ? AND id = ?',
+                [(resource, row[0]) for row in rows]
+            )
+            self.connection.executemany(
+                'INSERT INTO swapi_relations VALUES (?, ?, ?, ?, ?, ?)', relations
+            )
+            self.connection.commit()
+
+    def clear(self, resource):
+        with self._lock:
+            self.connection.execute('DELETE FROM swapi_{0}'.format(resource))
+            self.connection.execute('DELETE FROM swapi_relations WHERE resource = ?', (resource,))
+            self.connection.commit()
+
+    def resource(self, resource, id):
+        ''' Return the JSON data of a resource as swapi serves it, or None '''
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT * FROM swapi_{0} WHERE id = ?'.format(resource), (id,)
+            ).fetchone()
+            if row is None:
+                return None
+            relations = self.connection.execute(
+                '''SELECT field, position, related_resource, related_id FROM swapi_relations
+                   WHERE resource = ? AND id = ? ORDER BY field, position''',
+                (resource, id)
+            ).fetchall()
+        return self._build(resource, id, row, relations)
+
+    def _build(self, resource, id, row, relations):
+        to_many, to_one = RELATIONS[resource]
+        data = dict(zip(FIELDS[resource], row[1:-1]))
+        if row[-1]:
+            data.update(loads(row[-1]))
+        for field in to_many:
+            data[field] = []
+        for field in to_one:
+            data[field] = None
+        for field, position, related_resource, related_id in relations:
+            url = resource_url(related_resource, related_id)
+            if position < 0:
+                data[field] = url
+            else:
+                data.setdefault(field, []).append(url)
+        data['url'] = resource_url(resource, id)
+        return data
+
+    def page(self, resource, number):
+        ''' Return a list page of a resource as swapi serves it, or None past the last page '''
+        if number < 1:
+            return None
+        with self._lock:
+            count = self.connection.execute(
+                'SELECT COUNT(*) FROM swapi_{0}'.format(resource)
+            ).fetchone()[0]
+            ids = [row[0] for row in self.connection.execute(
+                'SELECT id FROM swapi_{0} ORDER BY id LIMIT ? OFFSET ?'.format(resource),
+                (self.page_size, (number - 1) * self.page_size)
+            )]
+        return list_page(
+            '{0}/{1}/'.format(settings.BASE_URL, resource), number, count, self.page_size,
+            [self.resource(resource, id) for id in ids],
+        )
+
+    def query(self, url):
+        ''' Serve a swapi url from the mirror '''
+        parsed = urlparse(url)
+        parts = [part for part in parsed.path.split('/') if part]
+        data = None
+        if parts and parts[-1] in RESOURCES:
+            number = parse_qs(parsed.query).get('page', ['1'])[0]
+            if number.isdigit():
+                data = self.page(parts[-1], int(number))
+        elif len(parts) > 1 and parts[-2] in RESOURCES and parts[-1].isdigit():
+            data = self.resource(parts[-2], int(parts[-1]))
+        if data is None:
+            raise ResourceDoesNotExist('Resource does not exist')
+        return MirrorResponse(url, json.dumps(data).encode())
+
+    def close(self):
+        self.connection.close()
+
+
+def crawl(base_url=None):
+    ''' Download every resource from base_url (settings.BASE_URL), whatever the backend
+
+    Returns the JSON data of the resources by resource type.
+    '''
+    try:
+        from swapi.utils import all_resources
+    except:
+        from utils import all_resources
+
+    base_url = (base_url or settings.BASE_URL).rstrip('/')
+    return {
+        resource: all_resources('{0}/{1}/'.format(base_url, resource), backend='http')
+        for resource in RESOURCES
+    }
+
+
+def snapshot(mirror=None):
+    ''' Crawl every resource from settings.BASE_URL into the mirror
+
+    Returns the number of resources stored by resource type.
+    '''
+    mirror = mirror or get_mirror()
+    mirror.create_tables()
+    counts = {}
+    for resource, resources in crawl().items():
+        mirror.clear(resource)
+        mirror.store(resource, resources)
+        counts[resource] = len(resources)
+    return counts
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror():
+    ''' Return the process-wide mirror '''
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = Mirror()
+    return _mirror
+
+
+def set_mirror(mirror):
+    global _mirror
+    with _mirror_lock:
+        if _mirror is not None and _mirror is not mirror:
+            _mirror.close()
+        _mirror = mirror
+    return mirror
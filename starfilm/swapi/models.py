@@ -1,51 +1,663 @@
-import json
+import sys
+import threading
 
 try:
-    from swapi.utils import query
+    from swapi import settings
+    from swapi.decoder import loads
+    from swapi.exceptions import FetchErrors, MultipleResourcesReturned, ResourceDoesNotExist
+    from swapi.fields import (
+        Link,
+        Relation,
+        parse_date,
+        parse_datetime,
+        parse_float,
+        parse_int,
+        resource_id,
+        resource_url,
+    )
+    from swapi.fetch import fetch_all
+    from swapi.identity import identity_map, url_key
+    from swapi.relations import get_relation_index
+    from swapi.search import search_index
+    from swapi.utils import all_resources, iter_pages, page_url, query
 except:
-    from utils import query
+    import settings
+    from decoder import loads
+    from exceptions import FetchErrors, MultipleResourcesReturned, ResourceDoesNotExist
+    from fields import (
+        Link,
+        Relation,
+        parse_date,
+        parse_datetime,
+        parse_float,
+        parse_int,
+        resource_id,
+        resource_url,
+    )
+    from fetch import fetch_all
+    from identity import identity_map, url_key
+    from relations import get_relation_index
+    from search import search_index
+    from utils import all_resources, iter_pages, page_url, query
+
+
+def get_resource(model, url):
+    ''' Return the model of url, fetching it only if it is not loaded yet '''
+    resource = identity_map.get(url)
+    if resource is None:
+        response = query(url)
+        resource = identity_map.load(model, loads(response.content))
+    return resource
 
 
 class BaseModel(object):
+    ''' Compact resource: one slot per field, typed values and id relations
+
+    Subclasses list their plain fields in __slots__, their parsers in
+    PARSERS and their relations as Relation/Link attributes backed by a
+    '_<name>' slot. Unknown keys of the payload are kept in _extra.
+    '''
+    __slots__ = ('id', '_extra', '_prefetched')
+    resource = None
+    # Fields indexed by swapi.search, the first one naming the resource
+    SEARCH_FIELDS = ()
+    PARSERS = {
+        'created': parse_datetime,
+        'edited': parse_datetime,
+    }
+
     def __init__(self, raw_data):
-        json_data = json.loads(raw_data)
+        ''' Build the model from a raw JSON payload or an already decoded dict '''
+        if isinstance(raw_data, dict):
+            json_data = raw_data
+        else:
+            json_data = loads(raw_data)
+        for slot in self._slots():
+            setattr(self, slot, None)
+        self._update(json_data)
+
+    @classmethod
+    def _slots(cls):
+        if '_all_slots' not in cls.__dict__:
+            cls._all_slots = tuple(
+                slot for c in cls.__mro__ for slot in c.__dict__.get('__slots__', ())
+            )
+            cls._fields = frozenset(
+                slot.lstrip('_') for slot in cls._all_slots if slot not in BaseModel.__slots__
+            )
+        return cls._all_slots
+
+    def _update(self, json_data):
+        cls = type(self)
+        cls._slots()
+        self._prefetched = None
         for key, value in json_data.items():
-            setattr(self, key, value)
+            if key == 'url':
+                self.id = resource_id(value)
+            elif key in cls.PARSERS:
+                setattr(self, key, cls.PARSERS[key](value))
+            elif key in cls._fields:
+                if isinstance(value, str) and len(value) <= 64:
+                    # Colors, genders, climates... are shared by many resources
+                    value = sys.intern(value)
+                setattr(self, key, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not a field
+        extra = object.__getattribute__(self, '_extra')
+        if extra and name in extra:
+            return extra[name]
+        raise AttributeError('{0!r} object has no attribute {1!r}'.format(
+            type(self).__name__, name))
+
+    @property
+    def url(self):
+        return resource_url(self.resource, self.id)
+
+    def ids(self, relation):
+        ''' Return the integer ids of a relation, e.g. film.ids('characters') '''
+        return getattr(self, '_' + relation)
+
+    def _related(self, relation):
+        ''' Urls of a relation, read from the relation index when one is installed '''
+        related_resource = getattr(type(self), relation).resource
+        return self._neighbour_urls(related_resource) or getattr(self, relation)
+
+    def _queryset(self, queryset_class, relation):
+        ''' Queryset of a relation, made of the prefetched models when there are some '''
+        if self._prefetched and relation in self._prefetched:
+            queryset = queryset_class()
+            queryset.items = list(self._prefetched[relation])
+            return queryset
+        return queryset_class(self._related(relation))
+
+    def _resource(self, model, relation):
+        ''' Model of a to-one relation, the prefetched one when there is one '''
+        if self._prefetched and relation in self._prefetched:
+            return self._prefetched[relation]
+        return get_resource(model, getattr(self, relation))
+
+    def _neighbour_urls(self, related_resource):
+        index = get_relation_index()
+        if index is None or (self.resource, self.id) not in index:
+            return None
+        return [
+            resource_url(related_resource, id)
+            for id in index.neighbours(self.resource, self.id, related_resource)
+        ]
+
+    def get_related(self, related_resource):
+        ''' Return every resource of a type linked to this one, in either direction
+
+        e.g. planet.get_related('species') finds the species whose homeworld
+        is the planet. It needs an installed relation index.
+        '''
+        urls = self._neighbour_urls(related_resource)
+        if urls is None:
+            raise LookupError('No relation index holds {0!r}'.format(self))
+        return QUERYSETS[related_resource](urls)
+
+
+class RefreshReport(object):
+    ''' What an incremental refresh of a queryset changed '''
+    def __init__(self, added=(), changed=(), removed=()):
+        self.added = list(added)
+        self.changed = list(changed)
+        self.removed = list(removed)
+
+    def __repr__(self):
+        return '<RefreshReport - {0}>'.format(self)
 
+    def __str__(self):
+        return '{0} new, {1} changed, {2} removed'.format(
+            len(self.added), len(self.changed), len(self.removed))
 
-class BaseQuerySet(object):
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+class _Stream(object):
+    ''' Items of a list endpoint, shared by the iterations of a queryset while they arrive '''
     def __init__(self):
         self.items = []
+        self.done = False
+        self.complete = False
+        self.condition = threading.Condition()
+
+
+# Guards the creation of the streams
+_streams_lock = threading.Lock()
 
-    def order_by(self, order_attribute):
-        ''' Return the list of items in a certain order '''
-        to_return = []
-        for f in sorted(self.items, key=lambda i: getattr(i, order_attribute)):
-            to_return.append(f)
-        return to_return
+
+def _sort_key(value):
+    # None last, and numbers never compared to the strings kept by the parsers
+    if value is None:
+        return (2, 0)
+    if isinstance(value, str):
+        return (1, value)
+    return (0, value)
+
+
+def _index_key(attribute, value):
+    if attribute == 'url' and isinstance(value, str):
+        return url_key(value)
+    return value
+
+
+LOOKUPS = {
+    'exact': lambda a, b: a == b,
+    'in': lambda a, b: a in b,
+    'gt': lambda a, b: a is not None and a > b,
+    'gte': lambda a, b: a is not None and a >= b,
+    'lt': lambda a, b: a is not None and a < b,
+    'lte': lambda a, b: a is not None and a <= b,
+    'contains': lambda a, b: a is not None and b in a,
+    'icontains': lambda a, b: isinstance(a, str) and b.lower() in a.lower(),
+    'startswith': lambda a, b: isinstance(a, str) and a.startswith(b),
+    'istartswith': lambda a, b: isinstance(a, str) and a.lower().startswith(b.lower()),
+}
+
+
+class BaseQuerySet(object):
+    ''' A lazy collection of models
+
+    Nothing is fetched until the items are needed. A queryset is backed
+    either by a list of resource urls, by a paginated list endpoint
+    (see from_list) or by already downloaded resources (see from_results).
+    Slicing and first() only fetch what they return, and count() is
+    answered from the urls or the count of the list endpoint.
+    '''
+    def __init__(self, model=None, list_of_urls=(), results=None, list_url=None):
+        self.model = model
+        self.errors = {}
+        self._urls = list(dict.fromkeys(list_of_urls))
+        self._list_url = list_url
+        self._pages = {}
+        self._items = None
+        self._stream = None
+        self._indexes = {}
+        self._orderings = {}
+        if results is not None:
+            self._items = [identity_map.load(model, data) for data in results]
+
+    @classmethod
+    def from_results(cls, results):
+        ''' Build the queryset from the resources of list pages, without refetching them '''
+        return cls(results=results)
+
+    @classmethod
+    def from_list(cls, list_url):
+        ''' Build a lazy queryset over every resource of a paginated list endpoint '''
+        return cls(list_url=list_url)
+
+    @property
+    def items(self):
+        ''' Every model of this queryset, fetched on first access '''
+        if self._items is None and self._stream is not None:
+            # Already being fetched by iter(), wait for it rather than fetch again
+            for _ in self.iter():
+                pass
+        if self._items is None:
+            self._items = self._fetch_all()
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self._items = items
+        self._invalidate()
+
+    def is_loaded(self):
+        return self._items is not None
+
+    def refresh(self):
+        ''' Forget the fetched items, they are fetched again on next access '''
+        self._items = None
+        self._stream = None
+        self._pages = {}
+        self.errors = {}
+        self._invalidate()
+
+    def refresh_changed(self):
+        ''' Refresh the items in place, replacing only the new and changed ones
+
+        The list pages, the resource urls or, for a queryset of loaded models
+        (filter(), from_results()), the urls of its items are revalidated
+        with the server, ETags sparing the unchanged ones, and the edited
+        timestamp of each resource is compared with the held model. Only a
+        list endpoint can tell that a resource was removed, the models whose
+        url failed are kept. Returns a RefreshReport.
+        '''
+        if self._items is None:
+            return RefreshReport(added=self.items)
+
+        held = {url_key(item.url): item for item in self._items}
+        if self._list_url is not None:
+            results = all_resources(self._list_url, revalidate=True)
+        else:
+            urls = self._urls or [item.url for item in self._items]
+            responses, errors = fetch_all(urls, revalidate=True)
+            self.errors = errors
+            results = [loads(response.content) for response in responses]
+
+        report = RefreshReport()
+        refreshed = {}
+        for data in results:
+            key = url_key(data['url'])
+            item = held.get(key)
+            if item is None:
+                item = identity_map.load(self.model, data)
+                report.added.append(item)
+            elif item.edited != parse_datetime(data.get('edited')):
+                # Reindexed for the search by the identity map listeners
+                identity_map.update(item, data)
+                report.changed.append(item)
+            refreshed[key] = item
+
+        if self._list_url is not None:
+            items = list(refreshed.values())
+            report.removed.extend(item for key, item in held.items() if key not in refreshed)
+            for item in report.removed:
+                identity_map.discard(item.url)
+                search_index.discard(item.resource, item.id)
+        else:
+            keys = dict.fromkeys([url_key(url) for url in urls] + list(held))
+            items = [refreshed.get(key) or held[key] for key in keys if key in refreshed or key in held]
+
+        self._items = items
+        self._pages = {}
+        self._invalidate()
+        return report
+
+    def _invalidate(self):
+        ''' Drop the hash indexes and the sort orders, the items changed '''
+        self._indexes = {}
+        self._orderings = {}
+
+    def _fetch_all(self):
+        if self._list_url is not None:
+            results = all_resources(self._list_url, pages=self._pages)
+            return [identity_map.load(self.model, data) for data in results]
+        return self._load_urls(self._urls)
+
+    def _load_urls(self, list_of_urls):
+        ''' Return the models of the urls, only fetching those not loaded yet '''
+        loaded = {}
+        for url in list_of_urls:
+            resource = identity_map.get(url)
+            if resource is not None:
+                loaded[url_key(url)] = resource
+
+        missing = [url for url in list_of_urls if url_key(url) not in loaded]
+        responses, errors = fetch_all(missing)
+        self.errors.update(errors)
+        for response in responses:
+            resource = identity_map.load(self.model, loads(response.content))
+            loaded[url_key(resource.url)] = resource
+
+        keys = dict.fromkeys(url_key(url) for url in list_of_urls)
+        return [loaded[key] for key in keys if key in loaded]
+
+    def _page(self, number):
+        ''' Return the JSON data of a page of the list endpoint '''
+        if number not in self._pages:
+            response = query(page_url(self._list_url, number))
+            self._pages[number] = loads(response.content)
+        return self._pages[number]
+
+    def _slice(self, start, stop):
+        ''' Return the models from start to stop, fetching only what is needed '''
+        if self._items is not None:
+            return self._items[start:stop]
+        if start >= stop:
+            return []
+        if self._list_url is None:
+            return self._load_urls(self._urls[start:stop])
+
+        page_size = len(self._page(1)['results']) or 1
+        resources = []
+        first_page = start // page_size + 1
+        last_page = (stop - 1) // page_size + 1
+        for number in range(first_page, last_page + 1):
+            resources.extend(self._page(number)['results'])
+        offset = (first_page - 1) * page_size
+        resources = resources[start - offset:stop - offset]
+        return [identity_map.load(self.model, data) for data in resources]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count())
+            if step < 0:
+                return self._slice(stop + 1, start + 1)[::step]
+            return self._slice(start, stop)[::step]
+        count = self.count()
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('queryset index out of range')
+        return self._slice(index, index + 1)[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def first(self):
+        ''' Return the first model, or None if the queryset is empty '''
+        models = self._slice(0, 1)
+        return models[0] if models else None
+
+    def prefetch(self, *relations):
+        ''' Fetch some relations of every item in one batched pass
+
+        The related urls of all the items are collected, deduplicated and
+        fetched concurrently in a single pass, then each item's getters
+        (get_characters(), get_homeworld()...) return the prefetched models.
+        Returns the queryset itself: films.prefetch('characters', 'planets').
+        '''
+        items = self.items
+        wanted = {}
+        for relation in relations:
+            field = getattr(self.model, relation, None)
+            if not isinstance(field, (Relation, Link)):
+                raise ValueError('{0} has no relation {1!r}'.format(self.model.__name__, relation))
+            related_model = MODELS[field.resource]
+            for item in items:
+                urls = [getattr(item, relation)] if isinstance(field, Link) else item._related(relation)
+                for url in urls:
+                    if url is not None:
+                        wanted[url_key(url)] = (url, related_model)
+
+        loaded = {}
+        for key, (url, related_model) in wanted.items():
+            resource = identity_map.get(url)
+            if resource is not None:
+                loaded[key] = resource
+        missing = [url for key, (url, _) in wanted.items() if key not in loaded]
+        responses, errors = fetch_all(missing)
+        self.errors.update(errors)
+        for response in responses:
+            data = loads(response.content)
+            key = url_key(data['url'])
+            loaded[key] = identity_map.load(wanted[key][1], data)
+
+        for relation in relations:
+            field = getattr(self.model, relation)
+            for item in items:
+                if item._prefetched is None:
+                    item._prefetched = {}
+                if isinstance(field, Link):
+                    url = getattr(item, relation)
+                    item._prefetched[relation] = loaded.get(url_key(url)) if url else None
+                else:
+                    item._prefetched[relation] = [
+                        loaded[url_key(url)] for url in item._related(relation)
+                        if url_key(url) in loaded
+                    ]
+        return self
+
+    def raise_for_errors(self):
+        ''' Raise FetchErrors if some resources of this queryset could not be fetched '''
+        if self.errors:
+            raise FetchErrors(self.errors)
+
+    def order_by(self, *order_attributes):
+        ''' Return the list of items in a certain order
+
+        Several attributes can be given, '-name' sorts in descending order.
+        The permutation is cached until the items change.
+        '''
+        permutation = self._orderings.get(order_attributes)
+        if permutation is None:
+            items = self.items
+            permutation = list(range(len(items)))
+            # Stable sorts, from the last key to the first
+            for attribute in reversed(order_attributes):
+                if attribute.startswith('-'):
+                    attribute = attribute[1:]
+                    # Still None last
+                    permutation.sort(key=lambda i: (
+                        getattr(items[i], attribute) is not None,
+                        _sort_key(getattr(items[i], attribute))
+                    ), reverse=True)
+                else:
+                    permutation.sort(key=lambda i: _sort_key(getattr(items[i], attribute)))
+            self._orderings[order_attributes] = permutation
+        items = self.items
+        return [items[i] for i in permutation]
+
+    def _index(self, attribute):
+        ''' Hash index of the items by attribute, built on first use '''
+        index = self._indexes.get(attribute)
+        if index is None:
+            index = {}
+            for position, item in enumerate(self.items):
+                index.setdefault(_index_key(attribute, getattr(item, attribute, None)), []).append(position)
+            self._indexes[attribute] = index
+        return index
+
+    def _positions(self, attribute, lookup, value):
+        ''' Positions of the items matching one condition '''
+        items = self.items
+        if lookup in ('exact', 'in'):
+            values = [value] if lookup == 'exact' else value
+            try:
+                index = self._index(attribute)
+                return {p for v in values for p in index.get(_index_key(attribute, v), ())}
+            except TypeError:
+                pass  # Unhashable values, e.g. relation url lists
+        test = LOOKUPS[lookup]
+        return {
+            position for position, item in enumerate(items)
+            if test(getattr(item, attribute, None), value)
+        }
+
+    def filter(self, **conditions):
+        ''' Return a new queryset of the items matching every condition
+
+        filter(episode_id=4), filter(episode_id__in=[4, 5]), filter(name__icontains='sky')...
+        see LOOKUPS for the supported lookups. Equality uses hash indexes.
+        '''
+        positions = None
+        for condition, value in conditions.items():
+            attribute, _, lookup = condition.partition('__')
+            if lookup and lookup not in LOOKUPS:
+                raise ValueError('Unknown lookup {0!r}'.format(lookup))
+            matching = self._positions(attribute, lookup or 'exact', value)
+            positions = matching if positions is None else positions & matching
+        items = self.items
+        if positions is None:
+            return self._derive(items)
+        return self._derive(items[p] for p in sorted(positions))
+
+    def get(self, pk=None, **conditions):
+        ''' Return the single item of id pk or matching the conditions '''
+        if pk is not None:
+            conditions['id'] = pk
+        matching = self.filter(**conditions).items
+        if not matching:
+            raise ResourceDoesNotExist('Resource does not exist')
+        if len(matching) > 1:
+            raise MultipleResourcesReturned(
+                '{0} resources match {1}'.format(len(matching), conditions))
+        return matching[0]
+
+    def _derive(self, items):
+        queryset = type(self)()
+        queryset._items = list(items)
+        return queryset
 
     def count(self):
-        ''' Get the number of items in this queryset'''
-        return len(self.items)
+        ''' Get the number of items in this queryset, without fetching them '''
+        if self._items is not None:
+            return len(self._items)
+        if self._list_url is not None:
+            return self._page(1)['count']
+        return len(self._urls)
     
     def iter(self):
-        ''' A generator that returns each resource in self.items '''
-        for i in self.items:
-            yield i
+        ''' A generator that returns each resource in self.items
+
+        When the items of a list endpoint are not loaded yet, they are
+        yielded page by page as the pages arrive, and kept once all are in.
+        Iterations running at the same time, from other threads, share the
+        download: the first one fetches the pages, the others follow the
+        items it has, and take over if it stops before the end.
+        '''
+        if self._items is not None or self._list_url is None:
+            for i in self.items:
+                yield i
+            return
+        with _streams_lock:
+            stream = self._stream
+            lead = stream is None
+            if lead:
+                stream = self._stream = _Stream()
+        if lead:
+            yield from self._lead(stream)
+        else:
+            yield from self._follow(stream)
+
+    def _lead(self, stream):
+        complete = False
+        try:
+            for results in iter_pages(self._list_url, pages=self._pages):
+                items = [identity_map.load(self.model, data) for data in results]
+                with stream.condition:
+                    stream.items.extend(items)
+                    stream.condition.notify_all()
+                for item in items:
+                    yield item
+            complete = True
+        finally:
+            # Also when the generator is closed or the download failed.
+            # The items are kept before the followers are told it is done
+            with _streams_lock:
+                if self._stream is stream:
+                    self._stream = None
+                    if complete:
+                        self.items = list(stream.items)
+            with stream.condition:
+                stream.done = True
+                stream.complete = complete
+                stream.condition.notify_all()
+
+    def _follow(self, stream):
+        position = 0
+        while True:
+            with stream.condition:
+                while position == len(stream.items) and not stream.done:
+                    stream.condition.wait()
+                items = stream.items[position:]
+                done = stream.done
+            for item in items:
+                yield item
+            position += len(items)
+            if done:
+                break
+        if not stream.complete:
+            # The leading iteration stopped early: go on from where it was,
+            # its pages are in the response cache
+            for i, item in enumerate(self.iter()):
+                if i >= position:
+                    yield item
 
 
 class StarshipQuerySet(BaseQuerySet):
-    def __init__(self, list_of_urls):
-        super(StarshipQuerySet, self).__init__()
-        for url in list_of_urls:
-            response = query(url)
-            self.items.append(Starship(response.content))
+    def __init__(self, list_of_urls=(), results=None, list_url=None):
+        super(StarshipQuerySet, self).__init__(Starship, list_of_urls, results, list_url)
 
     def __repr__(self):
-        return '<StarshipQuerySet - {0}>'.format(str(len(self.items)))
+        return '<StarshipQuerySet - {0}>'.format(self.count())
 
 
 class Starship(BaseModel):
+    __slots__ = (
+        'name', 'model', 'manufacturer', 'cost_in_credits', 'length',
+        'max_atmosphering_speed', 'crew', 'passengers', 'cargo_capacity',
+        'consumables', 'hyperdrive_rating', 'MGLT', 'starship_class',
+        'created', 'edited', '_pilots', '_films',
+    )
+    resource = settings.STARSHIPS
+    SEARCH_FIELDS = ('name', 'model', 'manufacturer', 'starship_class')
+    PARSERS = dict(
+        BaseModel.PARSERS,
+        cost_in_credits=parse_int,
+        length=parse_float,
+        max_atmosphering_speed=parse_int,
+        crew=parse_int,
+        passengers=parse_int,
+        cargo_capacity=parse_int,
+        hyperdrive_rating=parse_float,
+        MGLT=parse_int,
+    )
+    pilots = Relation(settings.PEOPLE)
+    films = Relation(settings.FILMS)
+
     def __init__(self, raw_data):
         super(Starship, self).__init__(raw_data)
 
@@ -53,24 +665,40 @@ class Starship(BaseModel):
         return '<Starship - {0}>'.format(self.name)
 
     def get_films(self):
-        return FilmQuerySet(self.films)
+        return self._queryset(FilmQuerySet, 'films')
 
     def get_pilots(self):
-        return PeopleQuerySet(self.pilots)
+        return self._queryset(PeopleQuerySet, 'pilots')
 
 
 class VehicleQuerySet(BaseQuerySet):
-    def __init__(self, list_of_urls):
-        super(VehicleQuerySet, self).__init__()
-        for url in list_of_urls:
-            response = query(url)
-            self.items.append(Vehicle(response.content))
+    def __init__(self, list_of_urls=(), results=None, list_url=None):
+        super(VehicleQuerySet, self).__init__(Vehicle, list_of_urls, results, list_url)
 
     def __repr__(self):
-        return '<VehicleQuerySet - {0}>'.format(str(len(self.items)))
+        return '<VehicleQuerySet - {0}>'.format(self.count())
 
 
 class Vehicle(BaseModel):
+    __slots__ = (
+        'name', 'model', 'manufacturer', 'cost_in_credits', 'length',
+        'max_atmosphering_speed', 'crew', 'passengers', 'cargo_capacity',
+        'consumables', 'vehicle_class', 'created', 'edited', '_pilots', '_films',
+    )
+    resource = settings.VEHICLES
+    SEARCH_FIELDS = ('name', 'model', 'manufacturer', 'vehicle_class')
+    PARSERS = dict(
+        BaseModel.PARSERS,
+        cost_in_credits=parse_int,
+        length=parse_float,
+        max_atmosphering_speed=parse_int,
+        crew=parse_int,
+        passengers=parse_int,
+        cargo_capacity=parse_int,
+    )
+    pilots = Relation(settings.PEOPLE)
+    films = Relation(settings.FILMS)
+
     def __init__(self, raw_data):
         super(Vehicle, self).__init__(raw_data)
 
@@ -78,24 +706,39 @@ class Vehicle(BaseModel):
         return '<Vehicle - {0}>'.format(self.name)
 
     def get_films(self):
-        return FilmQuerySet(self.films)
+        return self._queryset(FilmQuerySet, 'films')
 
     def get_pilots(self):
-        return PeopleQuerySet(self.pilots)
+        return self._queryset(PeopleQuerySet, 'pilots')
 
 
 class FilmQuerySet(BaseQuerySet):
-    def __init__(self, list_of_urls):
-        super(FilmQuerySet, self).__init__()
-        for url in list_of_urls:
-            response = query(url)
-            self.items.append(Film(response.content))
+    def __init__(self, list_of_urls=(), results=None, list_url=None):
+        super(FilmQuerySet, self).__init__(Film, list_of_urls, results, list_url)
 
     def __repr__(self):
-        return '<FilmQuerySet - {0}>'.format(str(len(self.items)))
+        return '<FilmQuerySet - {0}>'.format(self.count())
 
 
 class Film(BaseModel):
+    __slots__ = (
+        'title', 'episode_id', 'opening_crawl', 'director', 'producer',
+        'release_date', 'created', 'edited', '_characters', '_planets',
+        '_starships', '_vehicles', '_species',
+    )
+    resource = settings.FILMS
+    SEARCH_FIELDS = ('title', 'director', 'producer', 'opening_crawl')
+    PARSERS = dict(
+        BaseModel.PARSERS,
+        episode_id=parse_int,
+        release_date=parse_date,
+    )
+    characters = Relation(settings.PEOPLE)
+    planets = Relation(settings.PLANETS)
+    starships = Relation(settings.STARSHIPS)
+    vehicles = Relation(settings.VEHICLES)
+    species = Relation(settings.SPECIES)
+
     def __init__(self, raw_data):
         super(Film, self).__init__(raw_data)
 
@@ -103,19 +746,19 @@ class Film(BaseModel):
         return '<Film - {0}>'.format(self.title)
 
     def get_starships(self):
-        return StarshipQuerySet(self.starships)
+        return self._queryset(StarshipQuerySet, 'starships')
 
     def get_characters(self):
-        return PeopleQuerySet(self.characters)
+        return self._queryset(PeopleQuerySet, 'characters')
 
     def get_vehicles(self):
-        return VehicleQuerySet(self.vehicles)
+        return self._queryset(VehicleQuerySet, 'vehicles')
 
     def get_planets(self):
-        return PlanetQuerySet(self.planets)
+        return self._queryset(PlanetQuerySet, 'planets')
 
     def get_species(self):
-        return SpeciesQuerySet(self.species)
+        return self._queryset(SpeciesQuerySet, 'species')
 
     # def gen_opening_crawl(self):
     #     ''' Return a generator yielding each line of the opening crawl'''
@@ -137,17 +780,32 @@ class Film(BaseModel):
 
 
 class PlanetQuerySet(BaseQuerySet):
-    def __init__(self, list_of_urls):
-        super(PlanetQuerySet, self).__init__()
-        for url in list_of_urls:
-            response = query(url)
-            self.items.append(Planet(response.content))
+    def __init__(self, list_of_urls=(), results=None, list_url=None):
+        super(PlanetQuerySet, self).__init__(Planet, list_of_urls, results, list_url)
 
     def __repr__(self):
-        return '<PlanetQuerySet - {0}>'.format(str(len(self.items)))
+        return '<PlanetQuerySet - {0}>'.format(self.count())
 
 
 class Planet(BaseModel):
+    __slots__ = (
+        'name', 'rotation_period', 'orbital_period', 'diameter', 'climate',
+        'gravity', 'terrain', 'surface_water', 'population', 'created',
+        'edited', '_residents', '_films',
+    )
+    resource = settings.PLANETS
+    SEARCH_FIELDS = ('name', 'climate', 'terrain')
+    PARSERS = dict(
+        BaseModel.PARSERS,
+        rotation_period=parse_int,
+        orbital_period=parse_int,
+        diameter=parse_int,
+        surface_water=parse_float,
+        population=parse_int,
+    )
+    residents = Relation(settings.PEOPLE)
+    films = Relation(settings.FILMS)
+
     def __init__(self, raw_data):
         super(Planet, self).__init__(raw_data)
 
@@ -155,24 +813,37 @@ class Planet(BaseModel):
         return '<Planet - {0}>'.format(self.name)
 
     def get_films(self):
-        return FilmQuerySet(self.films)
+        return self._queryset(FilmQuerySet, 'films')
 
     def get_residents(self):
-        return PeopleQuerySet(self.residents)
+        return self._queryset(PeopleQuerySet, 'residents')
 
 
 class SpeciesQuerySet(BaseQuerySet):
-    def __init__(self, list_of_urls):
-        super(SpeciesQuerySet, self).__init__()
-        for url in list_of_urls:
-            response = query(url)
-            self.items.append(Species(response.content))
+    def __init__(self, list_of_urls=(), results=None, list_url=None):
+        super(SpeciesQuerySet, self).__init__(Species, list_of_urls, results, list_url)
 
     def __repr__(self):
-        return '<SpeciesQuerySet - {0}>'.format(str(len(self.items)))
+        return '<SpeciesQuerySet - {0}>'.format(self.count())
 
 
 class Species(BaseModel):
+    __slots__ = (
+        'name', 'classification', 'designation', 'average_height',
+        'skin_colors', 'hair_colors', 'eye_colors', 'average_lifespan',
+        'language', 'created', 'edited', '_homeworld', '_people', '_films',
+    )
+    resource = settings.SPECIES
+    SEARCH_FIELDS = ('name', 'classification', 'designation', 'language')
+    PARSERS = dict(
+        BaseModel.PARSERS,
+        average_height=parse_int,
+        average_lifespan=parse_int,
+    )
+    homeworld = Link(settings.PLANETS)
+    people = Relation(settings.PEOPLE)
+    films = Relation(settings.FILMS)
+
     def __init__(self, raw_data):
         super(Species, self).__init__(raw_data)
 
@@ -180,29 +851,43 @@ class Species(BaseModel):
         return '<Species - {0}>'.format(self.name)
 
     def get_films(self):
-        return FilmQuerySet(self.films)
+        return self._queryset(FilmQuerySet, 'films')
 
     def get_people(self):
-        return PeopleQuerySet(self.people)
+        return self._queryset(PeopleQuerySet, 'people')
 
     def get_homeworld(self):
-        response = query(self.homeworld)
-        return Planet(response.content)
+        return self._resource(Planet, 'homeworld')
 
 
 class PeopleQuerySet(BaseQuerySet):
-    def __init__(self, list_of_urls):
-        super(PeopleQuerySet, self).__init__()
-        for url in list_of_urls:
-            response = query(url)
-            self.items.append(People(response.content))
+    def __init__(self, list_of_urls=(), results=None, list_url=None):
+        super(PeopleQuerySet, self).__init__(People, list_of_urls, results, list_url)
 
     def __repr__(self):
-        return '<PeopleQuerySet - {0}>'.format(str(len(self.items)))
+        return '<PeopleQuerySet - {0}>'.format(self.count())
 
 
 class People(BaseModel):
     ''' Representing a single person '''
+    __slots__ = (
+        'name', 'height', 'mass', 'hair_color', 'skin_color', 'eye_color',
+        'birth_year', 'gender', 'created', 'edited', '_homeworld', '_films',
+        '_species', '_vehicles', '_starships',
+    )
+    resource = settings.PEOPLE
+    SEARCH_FIELDS = ('name', 'gender', 'hair_color', 'skin_color', 'eye_color')
+    PARSERS = dict(
+        BaseModel.PARSERS,
+        height=parse_int,
+        mass=parse_float,
+    )
+    homeworld = Link(settings.PLANETS)
+    films = Relation(settings.FILMS)
+    species = Relation(settings.SPECIES)
+    vehicles = Relation(settings.VEHICLES)
+    starships = Relation(settings.STARSHIPS)
+
     def __init__(self, raw_data):
         super(People, self).__init__(raw_data)
 
@@ -210,17 +895,35 @@ class People(BaseModel):
         return '<Person - {0}>'.format(self.name)
 
     def get_starships(self):
-        return StarshipQuerySet(self.starships)
+        return self._queryset(StarshipQuerySet, 'starships')
 
     def get_films(self):
-        return FilmQuerySet(self.films)
+        return self._queryset(FilmQuerySet, 'films')
 
     def get_vehicles(self):
-        return VehicleQuerySet(self.vehicles)
+        return self._queryset(VehicleQuerySet, 'vehicles')
 
     def get_homeworld(self):
-        response = query(self.homeworld)
-        return Planet(response.content)
+        return self._resource(Planet, 'homeworld')
 
     def get_species(self):
-        return SpeciesQuerySet(self.species)
\ No newline at end of file
+        return self._queryset(SpeciesQuerySet, 'species')
+
+
+QUERYSETS = {
+    settings.PEOPLE: PeopleQuerySet,
+    settings.PLANETS: PlanetQuerySet,
+    settings.STARSHIPS: StarshipQuerySet,
+    settings.VEHICLES: VehicleQuerySet,
+    settings.SPECIES: SpeciesQuerySet,
+    settings.FILMS: FilmQuerySet
+}
+
+MODELS = {
+    settings.PEOPLE: People,
+    settings.PLANETS: Planet,
+    settings.STARSHIPS: Starship,
+    settings.VEHICLES: Vehicle,
+    settings.SPECIES: Species,
+    settings.FILMS: Film
+}
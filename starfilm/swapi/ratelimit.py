@@ -0,0 +1,148 @@
+''' Client side scheduling of the swapi requests
+
+AdaptiveLimiter lets a request start when the token bucket has a token
+(settings.RATE_LIMIT per second, settings.RATE_BURST at once) and fewer
+than `limit` requests are in flight. The limit grows by one per round of
+fast successes and is halved on a throttled, failed or slow response
+(AIMD, like TCP congestion control), so parallel fetches settle near what
+the server accepts. A Retry-After pauses every request, not only the one
+that got it. AsyncAdaptiveLimiter does the same for the coroutines of aswapi.
+'''
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+try:
+    from swapi import settings
+except:
+    import settings
+
+
+def backoff(attempt):
+    ''' Seconds to wait before retry number attempt (from 0), exponential with full jitter '''
+    ceiling = min(settings.BACKOFF_MAX, settings.BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def retry_after(headers):
+    ''' Seconds asked by a Retry-After header, in seconds or as an HTTP date, or None '''
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), settings.BACKOFF_MAX)
+
+
+class AdaptiveLimiter(object):
+    ''' Token bucket on the request rate and AIMD bound on the requests in flight '''
+    def __init__(self, rate=None, burst=None, max_concurrency=None,
+                 min_concurrency=None, latency_target=None):
+        self.rate = settings.RATE_LIMIT if rate is None else rate
+        self.burst = burst or settings.RATE_BURST
+        self.max_concurrency = max_concurrency or settings.POOL_MAXSIZE
+        self.min_concurrency = min_concurrency or settings.MIN_CONCURRENCY
+        self.latency_target = latency_target or settings.LATENCY_TARGET
+        self.limit = float(min(settings.MAX_WORKERS, self.max_concurrency))
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def __repr__(self):
+        return '<{0} - {1}/{2} in flight>'.format(type(self).__name__, self.in_flight, int(self.limit))
+
+    def acquire(self):
+        ''' Block until a new request may start '''
+        with self._condition:
+            while True:
+                admitted, timeout = self._admit()
+                if admitted:
+                    return
+                self._condition.wait(timeout)
+
+    def _admit(self):
+        ''' Start a request if it may, else return the seconds to wait, None until a release '''
+        now = time.monotonic()
+        timeout = self._paused_until - now
+        if timeout > 0:
+            return False, timeout
+        if self.in_flight >= int(self.limit):
+            return False, None
+        if not self._take_token(now):
+            return False, (1 - self._tokens) / self.rate
+        self.in_flight += 1
+        return True, None
+
+    def _take_token(self, now):
+        if not self.rate:
+            return True
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def release(self, latency, failed=False):
+        ''' End a request that took latency seconds, failed when throttled or errored '''
+        with self._condition:
+            self._release(latency, failed)
+            self._condition.notify_all()
+
+    def _release(self, latency, failed):
+        self.in_flight -= 1
+        now = time.monotonic()
+        if failed or latency > self.latency_target:
+            # Halve once per round trip, not once per request of the same burst
+            if now - self._decreased_at > latency:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._decreased_at = now
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def pause(self, seconds):
+        ''' Hold every request for seconds, e.g. as asked by a Retry-After header '''
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+
+class AsyncAdaptiveLimiter(AdaptiveLimiter):
+    ''' AdaptiveLimiter of the coroutines of one event loop '''
+    def __init__(self, *args, **kwargs):
+        super(AsyncAdaptiveLimiter, self).__init__(*args, **kwargs)
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        ''' Wait until a new request may start '''
+        async with self._condition:
+            while True:
+                admitted, timeout = self._admit()
+                if admitted:
+                    return
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, latency, failed=False):
+        ''' End a request that took latency seconds, failed when throttled or errored '''
+        async with self._condition:
+            self._release(latency, failed)
+            self._condition.notify_all()
+
+    async def pause(self, seconds):
+        ''' Hold every request for seconds, e.g. as asked by a Retry-After header '''
+        async with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
@@ -0,0 +1,104 @@
+import threading
+from collections import defaultdict
+
+try:
+    from swapi.fields import Link, Relation
+except:
+    from fields import Link, Relation
+
+
+def relation_fields(model_class):
+    ''' Return the Relation and Link descriptors of a model class by name '''
+    fields = {}
+    for cls in reversed(model_class.__mro__):
+        for name, value in vars(cls).items():
+            if isinstance(value, (Relation, Link)):
+                fields[name] = value
+    return fields
+
+
+class RelationIndex(object):
+    ''' Bidirectional index of the relations between resources, by integer id
+
+    Every edge is stored both ways, so neighbours('people', 1, 'films') and
+    neighbours('planets', 1, 'people') (the residents, known from the
+    homeworld of each person) are single dict lookups.
+    '''
+    def __init__(self):
+        self._neighbours = defaultdict(lambda: defaultdict(set))
+        # Resources whose own relations were indexed, not only reached from others
+        self._indexed = set()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<RelationIndex - {0}>'.format(len(self._neighbours))
+
+    def __len__(self):
+        return len(self._neighbours)
+
+    def __contains__(self, node):
+        ''' (resource, id) in index, True once the relations of the resource are indexed '''
+        return node in self._indexed
+
+    @classmethod
+    def build(cls, models):
+        ''' Build the index of loaded models '''
+        index = cls()
+        for model in models:
+            index.add(model)
+        return index
+
+    @classmethod
+    def from_mirror(cls, mirror):
+        ''' Build the index of every resource of a swapi.mirror.Mirror '''
+        index = cls()
+        with mirror._lock:
+            for resource in mirror.resources():
+                for (id,) in mirror.connection.execute('SELECT id FROM swapi_{0}'.format(resource)):
+                    index._indexed.add((resource, id))
+            edges = mirror.connection.execute(
+                'SELECT resource, id, related_resource, related_id FROM swapi_relations'
+            ).fetchall()
+        for edge in edges:
+            index.add_edge(*edge)
+        return index
+
+    def add(self, model):
+        ''' Index the relations of a model, in both directions '''
+        node = (model.resource, model.id)
+        with self._lock:
+            self._indexed.add(node)
+            self._neighbours[node]
+            for field in relation_fields(type(model)).values():
+                value = getattr(model, field.slot)
+                ids = () if value is None else (value,) if isinstance(value, int) else value
+                for id in ids:
+                    self._neighbours[node][field.resource].add(id)
+                    self._neighbours[(field.resource, id)][model.resource].add(model.id)
+
+    def add_edge(self, resource, id, related_resource, related_id):
+        with self._lock:
+            self._neighbours[(resource, id)][related_resource].add(related_id)
+            self._neighbours[(related_resource, related_id)][resource].add(id)
+
+    def neighbours(self, resource, id, related_resource):
+        ''' Return the sorted ids of the related_resource linked to a resource '''
+        node = self._neighbours.get((resource, id))
+        if node is None or related_resource not in node:
+            return []
+        return sorted(node[related_resource])
+
+
+_index = None
+
+
+def get_relation_index():
+    ''' Return the installed relation index, or None '''
+    return _index
+
+
+def set_relation_index(index):
+    ''' Install the index used by the relation getters of the models, None removes it '''
+    global _index
+    _index = index
+    return index
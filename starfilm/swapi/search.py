@@ -0,0 +1,217 @@
+''' Full-text search over the catalog
+
+The SearchIndex is an inverted index from words to the resources they
+appear in, over the SEARCH_FIELDS of each model. It is fed by the identity
+map as models load, so it grows with whatever was browsed, and it is saved
+in the response cache database to be searchable at the next start.
+
+Every word of a query must match, as a word or as the start of one, so
+"lu sky" finds Luke Skywalker.
+'''
+import atexit
+import json
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+try:
+    from swapi.cache import get_cache
+    from swapi.identity import identity_map
+except:
+    from cache import get_cache
+    from identity import identity_map
+
+
+WORD = re.compile(r'\w+')
+# Weight of a word in the first search field (the name or the title) vs the others
+NAME_WEIGHT = 3
+FIELD_WEIGHT = 1
+
+
+def tokenize(text):
+    ''' Lowercase words of text, without accents: "Padmé Amidala" -> ["padme", "amidala"] '''
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return WORD.findall(text)
+
+
+def document_tokens(model):
+    ''' Return the {word: weight} of the search fields of a model '''
+    tokens = {}
+    for position, field in enumerate(type(model).SEARCH_FIELDS):
+        value = getattr(model, field, None)
+        if value is None:
+            continue
+        weight = NAME_WEIGHT if position == 0 else FIELD_WEIGHT
+        for token in tokenize(value):
+            if tokens.get(token, 0) < weight:
+                tokens[token] = weight
+    return tokens
+
+
+class SearchIndex(object):
+    ''' Inverted index of the catalog: word -> {(resource, id): weight}
+
+    A sorted vocabulary answers the prefix lookups with a bisection, it is
+    rebuilt on the first search after new words were indexed.
+    '''
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        # (resource, id) -> (edited, {word: weight}), to skip unchanged models
+        self._documents = {}
+        self._vocabulary = []
+        self._stale = False
+        # Documents changed since the last save()
+        self._unsaved = set()
+        self._restored = False
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return '<SearchIndex - {0}>'.format(len(self._documents))
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, key):
+        return key in self._documents
+
+    def add(self, model):
+        ''' Index a model, or reindex it if it was edited since '''
+        if not type(model).SEARCH_FIELDS:
+            return
+        key = (model.resource, model.id)
+        edited = str(model.edited)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None and document[0] == edited:
+                return
+            self._set(key, edited, document_tokens(model))
+            self._unsaved.add(key)
+
+    def discard(self, resource, id):
+        with self._lock:
+            self._set((resource, id), None, None)
+            self._unsaved.add((resource, id))
+
+    def _set(self, key, edited, tokens):
+        document = self._documents.pop(key, None)
+        if document is not None:
+            for token in document[1]:
+                postings = self._postings[token]
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[token]
+                    self._stale = True
+        if tokens is None:
+            return
+        self._documents[key] = (edited, tokens)
+        for token, weight in tokens.items():
+            if token not in self._postings:
+                self._stale = True
+            self._postings[token][key] = weight
+
+    def _matches(self, term):
+        ''' Return the {(resource, id): score} of the documents with a word starting with term '''
+        if self._stale:
+            self._vocabulary = sorted(self._postings)
+            self._stale = False
+        vocabulary = self._vocabulary
+        matches = {}
+        i = bisect_left(vocabulary, term)
+        while i < len(vocabulary) and vocabulary[i].startswith(term):
+            token = vocabulary[i]
+            # A whole word match ranks above a prefix match
+            bonus = 2 if token == term else 1
+            for key, weight in self._postings[token].items():
+                score = weight * bonus
+                if matches.get(key, 0) < score:
+                    matches[key] = score
+            i += 1
+        return matches
+
+    def search(self, text, resources=None, limit=None):
+        ''' Return the (resource, id) of the documents matching every word of text, best first '''
+        terms = tokenize(text)
+        if not terms:
+            return []
+        if not self._restored:
+            self.restore()
+        with self._lock:
+            # Rarest words first, the intersection only shrinks
+            found = sorted((self._matches(term) for term in set(terms)), key=len)
+            scores = dict(found[0])
+            for matches in found[1:]:
+                scores = {
+                    key: score + matches[key]
+                    for key, score in scores.items() if key in matches
+                }
+        keys = [
+            key for key in scores if resources is None or key[0] in resources
+        ]
+        keys.sort(key=lambda key: (-scores[key], key))
+        return keys[:limit]
+
+    def _table(self, cache):
+        cache.connection.execute(
+            '''CREATE TABLE IF NOT EXISTS search_documents (
+                resource TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                edited TEXT NOT NULL,
+                tokens TEXT NOT NULL,
+                PRIMARY KEY (resource, id)
+            )'''
+        )
+
+    def restore(self, cache=None):
+        ''' Add the documents saved in the cache database, unless indexed since '''
+        self._restored = True
+        cache = cache or get_cache()
+        if cache is None:
+            return
+        with cache._lock:
+            self._table(cache)
+            rows = cache.connection.execute(
+                'SELECT resource, id, edited, tokens FROM search_documents'
+            ).fetchall()
+        with self._lock:
+            for resource, id, edited, tokens in rows:
+                key = (resource, id)
+                if key not in self._documents and key not in self._unsaved:
+                    self._set(key, edited, json.loads(tokens))
+
+    def save(self, cache=None):
+        ''' Write the documents changed since the last save in the cache database '''
+        if not self._unsaved:
+            return
+        cache = cache or get_cache()
+        if cache is None:
+            return
+        with self._lock:
+            keys, self._unsaved = self._unsaved, set()
+            documents = [(key, self._documents.get(key)) for key in keys]
+        with cache._lock:
+            self._table(cache)
+            cache.connection.executemany(
+                'DELETE FROM search_documents WHERE resource = ? AND id = ?',
+                [key for key, document in documents if document is None]
+            )
+            cache.connection.executemany(
+                'INSERT OR REPLACE INTO search_documents VALUES (?, ?, ?, ?)',
+                [(key[0], key[1], document[0], json.dumps(document[1]))
+                 for key, document in documents if document is not None]
+            )
+            cache.connection.commit()
+
+
+search_index = SearchIndex()
+identity_map.subscribe(search_index.add)
+
+
+@atexit.register
+def _save():
+    try:
+        search_index.save()
+    except Exception:
+        pass
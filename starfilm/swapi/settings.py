@@ -1,5 +1,6 @@
 import os
-BASE_URL = 'http://swapi.dev/api'
+# swapi server, e.g. a local swapi.standin for benchmarks
+BASE_URL = os.environ.get('STARFILM_BASE_URL', 'http://swapi.dev/api').rstrip('/')
 
 PEOPLE = 'people'
 PLANETS = 'planets'
@@ -7,3 +8,57 @@ STARSHIPS = 'starships'
 VEHICLES = 'vehicles'
 FILMS = 'films'
 SPECIES = 'species'
+
+# HTTP client
+USER_AGENT = None       # Keep the requests default when None
+TIMEOUT = 10
+POOL_CONNECTIONS = 4    # Number of hosts kept in the pool
+POOL_MAXSIZE = 16       # Connections kept alive per host
+POOL_BLOCK = True       # Wait for a free connection instead of opening more
+
+# Concurrent fetching
+MAX_WORKERS = 8         # Threads used to fetch the resources of a queryset
+
+# Rate limiting and retries
+RATE_LIMIT = 100.0      # Requests started per second, None for no limit
+RATE_BURST = 50         # Requests that may start at once after a quiet period
+MIN_CONCURRENCY = 1     # Requests in flight, between this and POOL_MAXSIZE, adapted
+LATENCY_TARGET = 2.0    # Seconds; slower responses lower the requests in flight
+RETRIES = 4             # Retries of a 429, a 5xx or a connection error
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_BASE = 0.5      # Seconds; the backoff doubles at each retry, with jitter
+BACKOFF_MAX = 30.0      # Seconds; longest wait between two retries
+
+# On-disk response cache
+CACHE_ENABLED = os.environ.get('STARFILM_CACHE', '1') != '0'
+CACHE_PATH = os.environ.get(
+    'STARFILM_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'starfilm', 'swapi.sqlite'),
+)
+CACHE_TTL = 24 * 60 * 60                 # Seconds a response is served without revalidation
+CACHE_MAX_SIZE = 50 * 1024 * 1024        # Bytes of content kept before evicting
+CACHE_STALE_WHILE_REVALIDATE = True      # Serve expired responses while refreshing them
+CACHE_TOUCH_BATCH = 256                  # Cache hits whose access times are written at once
+
+# In-process identity map
+IDENTITY_MAP_MAX_ITEMS = 2000            # Models kept in memory, least recently used dropped first
+IDENTITY_MAP_MAX_SIZE = 32 * 1024 * 1024 # Approximate bytes of models kept in memory
+
+# JSON decoding: 'auto' picks orjson, then msgspec, then the json module
+JSON_DECODER = os.environ.get('STARFILM_JSON_DECODER', 'auto')
+
+# Backend serving the catalog: 'http' for BASE_URL, 'mirror' for the local snapshot
+BACKEND = os.environ.get('STARFILM_BACKEND', 'http')
+MIRROR_PATH = os.environ.get(
+    'STARFILM_MIRROR_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                 'db', 'db_StarFilm.db'),
+)
+MIRROR_PAGE_SIZE = 10   # Same page size as swapi.dev
+
+# Recorded catalog replayed by swapi.standin
+FIXTURES_PATH = os.environ.get(
+    'STARFILM_FIXTURES_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                 'db', 'swapi_fixtures'),
+)
@@ -0,0 +1,416 @@
+''' Local stand-in for swapi.dev, replaying recorded JSON
+
+It serves the six resources with the swapi pagination, ETags and 404s,
+after a configurable latency, and answers a share of the requests with
+a 503 or a 429, to measure the client offline:
+
+    python starfilm/swapi/standin.py --latency 0.1 --jitter 0.05 --error-rate 0.02
+    STARFILM_BASE_URL=http://127.0.0.1:8000/api python main.py
+
+The catalog comes from a fixture directory (one <resource>.json list per
+resource) or from the mirror of swapi.mirror.snapshot(). The fixtures of
+db/swapi_fixtures are a catalog made up by generate(), with the counts
+and the shape of swapi.dev; record() replaces them with the real one:
+
+    python starfilm/swapi/standin.py --record      # online
+    python starfilm/swapi/standin.py --generate    # offline
+
+In a benchmark or a test, the server can run in-process:
+
+    with StandIn(load_fixtures(settings.FIXTURES_PATH), latency=0.05) as server:
+        settings.BASE_URL = server.base_url
+        ...
+'''
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from swapi import settings
+    from swapi.mirror import RESOURCE_URL, RESOURCES, Mirror, crawl, list_page
+except:
+    import settings
+    from mirror import RESOURCE_URL, RESOURCES, Mirror, crawl, list_page
+
+
+# Number of resources of each type on swapi.dev
+COUNTS = {
+    settings.FILMS: 6,
+    settings.PEOPLE: 82,
+    settings.PLANETS: 60,
+    settings.SPECIES: 37,
+    settings.STARSHIPS: 36,
+    settings.VEHICLES: 39,
+}
+FILMS = [
+    # title, episode_id, director, producer, release_date
+    ('A New Hope', 4, 'George Lucas', 'Gary Kurtz, Rick McCallum', '1977-05-25'),
+    ('The Empire Strikes Back', 5, 'Irvin Kershner', 'Gary Kurtz, Rick McCallum', '1980-05-17'),
+    ('Return of the Jedi', 6, 'Richard Marquand',
+     'Howard G. Kazanjian, George Lucas, Rick McCallum', '1983-05-25'),
+    ('The Phantom Menace', 1, 'George Lucas', 'Rick McCallum', '1999-05-19'),
+    ('Attack of the Clones', 2, 'George Lucas', 'Rick McCallum', '2002-05-16'),
+    ('Revenge of the Sith', 3, 'George Lucas', 'Rick McCallum', '2005-05-19'),
+]
+SYLLABLES = ('ka', 'ren', 'do', 'vi', 'ta', 'lor', 'mi', 'sa', 'bel', 'zu', 'an', 'kor', 'e', 'tho')
+
+
+def _write(path, catalog):
+    os.makedirs(path, exist_ok=True)
+    for resource, resources in catalog.items():
+        with open(os.path.join(path, resource + '.json'), 'w', encoding='utf-8') as file:
+            json.dump(resources, file, ensure_ascii=False, indent=1)
+    return {resource: len(resources) for resource, resources in catalog.items()}
+
+
+def record(path, base_url=None):
+    ''' Crawl every resource from base_url (settings.BASE_URL) into path/<resource>.json
+
+    Returns the number of resources recorded by resource type.
+    '''
+    return _write(path, crawl(base_url))
+
+
+def generate(path, seed=0):
+    ''' Write a made-up catalog with the counts, fields and relations of swapi.dev into path
+
+    The films are the six of swapi.dev, the other names are random. Returns
+    the number of resources written by resource type.
+    '''
+    rng = random.Random(seed)
+
+    def url(resource, id):
+        return 'https://swapi.dev/api/{0}/{1}/'.format(resource, id)
+
+    def name(words=2):
+        return ' '.join(
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+            for _ in range(words)
+        )
+
+    def number(low, high, unknown=0.1):
+        return 'unknown' if rng.random() < unknown else str(rng.randint(low, high))
+
+    def timestamps(data):
+        day = rng.randint(10, 20)
+        data['created'] = '2014-12-{0:02d}T{1:02d}:{2:02d}:{3:02d}.{4:06d}Z'.format(
+            day, rng.randrange(24), rng.randrange(60), rng.randrange(60), rng.randrange(10 ** 6))
+        data['edited'] = '2014-12-{0:02d}T{1:02d}:{2:02d}:{3:02d}.{4:06d}Z'.format(
+            day + 1, rng.randrange(24), rng.randrange(60), rng.randrange(60), rng.randrange(10 ** 6))
+        return data
+
+    catalog = {resource: {id: {} for id in range(1, count + 1)} for resource, count in COUNTS.items()}
+    for id, (title, episode_id, director, producer, release_date) in enumerate(FILMS, 1):
+        catalog[settings.FILMS][id].update(
+            title=title, episode_id=episode_id,
+            opening_crawl='Episode {0}\r\n{1}\r\n\r\nIt is a period of civil war.'.format(
+                episode_id, title.upper()),
+            director=director, producer=producer, release_date=release_date,
+            characters=[], planets=[], starships=[], vehicles=[], species=[],
+        )
+    for data in catalog[settings.PLANETS].values():
+        data.update(
+            name=name(1), rotation_period=number(10, 40), orbital_period=number(200, 600),
+            diameter=number(4000, 20000), climate=rng.choice(('arid', 'temperate', 'frozen', 'murky')),
+            gravity='1 standard', terrain=rng.choice(('desert', 'grasslands, mountains', 'jungle', 'ocean')),
+            surface_water=number(0, 100), population=number(1000, 10 ** 9),
+            residents=[], films=[],
+        )
+    for data in catalog[settings.SPECIES].values():
+        data.update(
+            name=name(1), classification=rng.choice(('mammal', 'reptile', 'artificial', 'amphibian')),
+            designation=rng.choice(('sentient', 'reptilian')), average_height=number(80, 250),
+            skin_colors='grey, green', hair_colors='none', eye_colors='yellow',
+            average_lifespan=number(50, 1000), homeworld=None, language=name(1),
+            people=[], films=[],
+        )
+    for resource, kind in ((settings.STARSHIPS, 'starship'), (settings.VEHICLES, 'vehicle')):
+        for data in catalog[resource].values():
+            data.update(
+                name=name(), model=name() + ' ' + kind, manufacturer=name() + ' Corporation',
+                cost_in_credits=number(10 ** 4, 10 ** 8), length=number(5, 2000),
+                max_atmosphering_speed=number(300, 1500), crew=number(1, 1000),
+                passengers=number(0, 500), cargo_capacity=number(0, 10 ** 6),
+                consumables=rng.choice(('1 week', '2 months', '1 year')), pilots=[], films=[],
+            )
+            if resource == settings.STARSHIPS:
+                data.update(hyperdrive_rating='{0:.1f}'.format(rng.uniform(0.5, 4)),
+                            MGLT=number(40, 120), starship_class=rng.choice(('Starfighter', 'Cruiser')))
+            else:
+                data.update(vehicle_class=rng.choice(('wheeled', 'repulsorcraft', 'walker')))
+    for data in catalog[settings.PEOPLE].values():
+        data.update(
+            name=name(), height=number(60, 230), mass=number(20, 160),
+            hair_color=rng.choice(('blond', 'brown', 'black', 'none')),
+            skin_color=rng.choice(('fair', 'light', 'dark', 'green')),
+            eye_color=rng.choice(('blue', 'brown', 'yellow', 'red')),
+            birth_year=rng.choice(('{0}BBY'.format(rng.randint(8, 900)), 'unknown')),
+            gender=rng.choice(('male', 'female', 'n/a')), homeworld=None,
+            films=[], species=[], vehicles=[], starships=[],
+        )
+
+    def link(resource, field, related, back, pairs):
+        for id, related_id in sorted(set(pairs)):
+            catalog[resource][id][field].append(url(related, related_id))
+            catalog[related][related_id][back].append(url(resource, id))
+
+    films = range(1, COUNTS[settings.FILMS] + 1)
+    for resource, field in ((settings.PEOPLE, 'characters'), (settings.PLANETS, 'planets'),
+                            (settings.STARSHIPS, 'starships'), (settings.VEHICLES, 'vehicles'),
+                            (settings.SPECIES, 'species')):
+        link(settings.FILMS, field, resource, 'films', [
+            (film, id) for id in range(1, COUNTS[resource] + 1)
+            for film in rng.sample(films, rng.randint(1, 3))
+        ])
+    for id, data in catalog[settings.PEOPLE].items():
+        planet = rng.randint(1, COUNTS[settings.PLANETS])
+        data['homeworld'] = url(settings.PLANETS, planet)
+        catalog[settings.PLANETS][planet]['residents'].append(url(settings.PEOPLE, id))
+    for data in catalog[settings.SPECIES].values():
+        data['homeworld'] = url(settings.PLANETS, rng.randint(1, COUNTS[settings.PLANETS]))
+    link(settings.SPECIES, 'people', settings.PEOPLE, 'species', [
+        (rng.randint(1, COUNTS[settings.SPECIES]), id)
+        for id in range(1, COUNTS[settings.PEOPLE] + 1) if rng.random() < 0.5
+    ])
+    for resource in (settings.STARSHIPS, settings.VEHICLES):
+        link(resource, 'pilots', settings.PEOPLE, resource, [
+            (id, rng.randint(1, COUNTS[settings.PEOPLE]))
+            for id in range(1, COUNTS[resource] + 1) if rng.random() < 0.4
+        ])
+
+    return _write(path, {
+        resource: [dict(timestamps(data), url=url(resource, id)) for id, data in resources.items()]
+        for resource, resources in catalog.items()
+    })
+
+
+def load_fixtures(path):
+    ''' Return the catalog recorded in a fixture directory: {resource: [JSON data]} '''
+    catalog = {}
+    for resource in RESOURCES:
+        file_path = os.path.join(path, resource + '.json')
+        if os.path.exists(file_path):
+            with open(file_path, encoding='utf-8') as file:
+                catalog[resource] = json.load(file)
+    return catalog
+
+
+def load_mirror(mirror=None):
+    ''' Return the catalog of a swapi.mirror.Mirror: {resource: [JSON data]} '''
+    mirror = mirror or Mirror()
+    catalog = {}
+    for resource in mirror.resources():
+        with mirror._lock:
+            ids = [row[0] for row in mirror.connection.execute(
+                'SELECT id FROM swapi_{0} ORDER BY id'.format(resource)
+            )]
+        catalog[resource] = [mirror.resource(resource, id) for id in ids]
+    return catalog
+
+
+class StandIn(object):
+    ''' swapi compatible HTTP server over a catalog of recorded resources
+
+    Each response waits latency seconds, give or take up to jitter, and
+    error_rate / throttle_rate of the requests get a 503 / a 429 with a
+    Retry-After. seed makes the injected delays and failures repeatable.
+    '''
+    def __init__(self, catalog, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=1, page_size=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.page_size = page_size or settings.MIRROR_PAGE_SIZE
+        self.hits = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self.catalog = self._index(catalog)
+
+    def __repr__(self):
+        return '<StandIn - {0}>'.format(self.base_url)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}/api'.format(host, port)
+
+    def _index(self, catalog):
+        ''' {resource: {id: JSON data}}, the urls rewritten to point to this server '''
+        indexed = {}
+        for resource, resources in catalog.items():
+            if not resources:
+                continue
+            # swapi mixes http and https in its urls
+            first_url = resources[0]['url']
+            source = first_url[:RESOURCE_URL.search(first_url).start()].split('://', 1)[-1]
+            raw = re.sub(
+                r'https?://{0}/'.format(re.escape(source)), self.base_url + '/', json.dumps(resources)
+            )
+            by_id = {int(data['url'].rstrip('/').rsplit('/', 1)[1]): data for data in json.loads(raw)}
+            indexed[resource] = dict(sorted(by_id.items()))
+        return indexed
+
+    def start(self):
+        ''' Serve on a background thread '''
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def delay(self):
+        ''' Seconds to wait before answering a request '''
+        with self._lock:
+            self.hits += 1
+            if not self.jitter:
+                return self.latency
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def failure(self):
+        ''' Status of an injected failure for the next request, or None '''
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.throttle_rate:
+            return 429
+        if draw < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+    def answer(self, path):
+        ''' Return (status, JSON data) of a swapi path '''
+        parsed = urlparse(path)
+        parts = [part for part in parsed.path.split('/') if part]
+        if parts == ['api']:
+            return 200, {
+                resource: '{0}/{1}/'.format(self.base_url, resource) for resource in self.catalog
+            }
+        if len(parts) == 2 and parts[0] == 'api' and parts[1] in self.catalog:
+            number = parse_qs(parsed.query).get('page', ['1'])[0]
+            if number.isdigit():
+                page = self.page(parts[1], int(number))
+                if page is not None:
+                    return 200, page
+        if len(parts) == 3 and parts[0] == 'api' and parts[1] in self.catalog \
+                and parts[2].isdigit() and int(parts[2]) in self.catalog[parts[1]]:
+            return 200, self.catalog[parts[1]][int(parts[2])]
+        return 404, {'detail': 'Not found'}
+
+    def page(self, resource, number):
+        ''' Return a list page as swapi serves it, or None past the last page '''
+        resources = list(self.catalog[resource].values())
+        start = (number - 1) * self.page_size
+        return list_page(
+            '{0}/{1}/'.format(self.base_url, resource), number, len(resources), self.page_size,
+            resources[start:start + self.page_size] if number > 0 else [],
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send the headers and the body in one segment, or delayed ACKs add ~40 ms
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        standin = self.server.standin
+        time.sleep(standin.delay())
+
+        failure = standin.failure()
+        if failure is not None:
+            self.send_response(failure)
+            if failure == 429:
+                self.send_header('Retry-After', str(standin.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status, data = standin.answer(self.path)
+        content = json.dumps(data).encode()
+        etag = '"{0}"'.format(hashlib.md5(content).hexdigest())
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if status == 200:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for swapi.dev')
+    parser.add_argument('--fixtures', default=settings.FIXTURES_PATH,
+                        help='directory of the recorded <resource>.json files')
+    parser.add_argument('--mirror', action='store_true',
+                        help='serve the mirror of swapi.mirror.snapshot() instead of the fixtures')
+    parser.add_argument('--record', action='store_true',
+                        help='record the fixtures from STARFILM_BASE_URL, then exit')
+    parser.add_argument('--generate', action='store_true',
+                        help='write a made-up catalog as the fixtures, then exit')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='seconds, added or removed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 503 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of 429 responses')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.record or args.generate:
+        counts = record(args.fixtures) if args.record else generate(args.fixtures, args.seed or 0)
+        print('{0} {1} in {2}'.format(
+            'Recorded' if args.record else 'Generated',
+            ', '.join('{0} {1}'.format(n, resource) for resource, n in counts.items()),
+            args.fixtures))
+        return
+
+    catalog = load_mirror() if args.mirror else load_fixtures(args.fixtures)
+    if not catalog:
+        parser.error('nothing to serve in {0}, record it with --record first'.format(
+            settings.MIRROR_PATH if args.mirror else args.fixtures))
+    standin = StandIn(
+        catalog, args.host, args.port, args.latency, args.jitter,
+        args.error_rate, args.throttle_rate, seed=args.seed,
+    )
+    print('Serving {0} resources on {1}'.format(
+        sum(map(len, standin.catalog.values())), standin.base_url))
+    try:
+        standin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
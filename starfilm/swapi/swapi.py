@@ -1,7 +1,15 @@
 try:
     from swapi import settings
-    from swapi.utils import query, all_resource_urls
+    from swapi.exceptions import ResourceDoesNotExist
+    from swapi.fields import resource_url
+    from swapi.mirror import get_mirror, snapshot
+    from swapi.relations import RelationIndex, set_relation_index
+    from swapi.search import search_index
+    from swapi.utils import query
     from swapi.models import (
+        get_resource,
+        MODELS,
+        QUERYSETS,
         People,
         PeopleQuerySet,
         Planet,
@@ -17,8 +25,16 @@ try:
     )
 except:
     import settings
-    from utils import query, all_resource_urls
+    from exceptions import ResourceDoesNotExist
+    from fields import resource_url
+    from mirror import get_mirror, snapshot
+    from relations import RelationIndex, set_relation_index
+    from search import search_index
+    from utils import query
     from models import (
+        get_resource,
+        MODELS,
+        QUERYSETS,
         People,
         PeopleQuerySet,
         Planet,
@@ -33,61 +49,83 @@ except:
         FilmQuerySet,
     )
 
+def _url(id, type):
+    return f"{settings.BASE_URL}/{type}/{id}/"
+
+
 def _get(id, type):
     ''' Return a single person '''
-    result = query(f"{settings.BASE_URL}/{type}/{id}/")
+    result = query(_url(id, type))
     return result
 
 
 def get_all(resource):
-    ''' Return all of a single resource '''
-    QUERYSETS = {
-        settings.PEOPLE: PeopleQuerySet,
-        settings.PLANETS: PlanetQuerySet,
-        settings.STARSHIPS: StarshipQuerySet,
-        settings.VEHICLES: VehicleQuerySet,
-        settings.SPECIES: SpeciesQuerySet,
-        settings.FILMS: FilmQuerySet
-    }
-
-    urls = all_resource_urls(
+    ''' Return a lazy queryset of all of a single resource '''
+    return QUERYSETS[resource].from_list(
         "{0}/{1}/".format(settings.BASE_URL, resource)
     )
 
-    return QUERYSETS[resource](urls)
+
+def iter_all(resource):
+    ''' Yield every model of a single resource, page by page as the pages arrive '''
+    return get_all(resource).iter()
 
 
 def get_planet(planet_id):
     ''' Return a single planet '''
-    result = _get(planet_id, settings.PLANETS)
-    return Planet(result.content)
+    return get_resource(Planet, _url(planet_id, settings.PLANETS))
 
 
 def get_person(people_id):
     ''' Return a single person '''
-    result = _get(people_id, settings.PEOPLE)
-    return People(result.content)
+    return get_resource(People, _url(people_id, settings.PEOPLE))
 
 
 def get_starship(starship_id):
     ''' Return a single starship '''
-    result = _get(starship_id, settings.STARSHIPS)
-    return Starship(result.content)
+    return get_resource(Starship, _url(starship_id, settings.STARSHIPS))
 
 
 def get_vehicle(vehicle_id):
     ''' Return a single vehicle '''
-    result = _get(vehicle_id, settings.VEHICLES)
-    return Vehicle(result.content)
+    return get_resource(Vehicle, _url(vehicle_id, settings.VEHICLES))
 
 
 def get_species(species_id):
     ''' Return a single species '''
-    result = _get(species_id, settings.SPECIES)
-    return Species(result.content)
+    return get_resource(Species, _url(species_id, settings.SPECIES))
 
 
 def get_film(film_id):
     ''' Return a single film '''
-    result = _get(film_id, settings.FILMS)
-    return Film(result.content)
\ No newline at end of file
+    return get_resource(Film, _url(film_id, settings.FILMS))
+
+
+def build_relation_index(*resources):
+    ''' Build and install the relation index of the whole catalog, or of some resources
+
+    The model relation getters then read their neighbours from the index.
+    '''
+    if settings.BACKEND == 'mirror':
+        index = RelationIndex.from_mirror(get_mirror())
+    else:
+        index = RelationIndex()
+        for resource in resources or QUERYSETS:
+            for model in get_all(resource).items:
+                index.add(model)
+    return set_relation_index(index)
+
+
+def search(text, resources=None, limit=None):
+    ''' Return the models matching every word of text, best matches first
+
+    Only the resources loaded at some point, in this run or a previous one
+    with the cache enabled, are searched.
+    '''
+    models = []
+    for resource, id in search_index.search(text, resources, limit):
+        try:
+            models.append(get_resource(MODELS[resource], resource_url(resource, id)))
+        except ResourceDoesNotExist:
+            search_index.discard(resource, id)
+    return models
@@ -1,30 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
 import requests
-import json
+
 try:
-    from swapi import exceptions
+    from swapi import exceptions, settings
+    from swapi.cache import get_cache
+    from swapi.client import get_client
+    from swapi.decoder import loads
+    from swapi.mirror import get_mirror
+    from swapi.ratelimit import retry_after
 except:
-    import exceptions
+    import exceptions, settings
+    from cache import get_cache
+    from client import get_client
+    from decoder import loads
+    from mirror import get_mirror
+    from ratelimit import retry_after
+
+
+def query(query, revalidate=False, backend=None):
+    ''' GET a resource, going through the response cache when it is enabled
+
+    With revalidate, a cached response is checked with the server
+    (ETag/Last-Modified) even if it is still fresh. backend, 'http' or
+    'mirror', overrides settings.BACKEND for this call.
+    '''
+    if (backend or settings.BACKEND) == 'mirror':
+        return get_mirror().query(query)
+
+    cache = get_cache()
+    if cache is None:
+        return _fetch(query)
+
+    cached = cache.get(query)
+    if cached is None:
+        response = _fetch(query)
+        cache.set(query, response)
+        return response
+    if cache.is_fresh(cached) and not revalidate:
+        return cached
+    if cache.stale_while_revalidate and not revalidate:
+        cache.revalidate_later(query, lambda url: _revalidate(cache, url, cached))
+        return cached
+    try:
+        return _revalidate(cache, query, cached)
+    except (requests.RequestException, exceptions.RateLimited, exceptions.ServerError):
+        # Offline or throttled: an outdated catalog is better than none
+        return cached
+
 
+def raise_for_status(status, headers):
+    ''' Raise the exception matching the status of a failed response: 404, 429 or other '''
+    if status == 404:
+        raise exceptions.ResourceDoesNotExist('Resource does not exist', status)
+    if status == 429:
+        raise exceptions.RateLimited('Too many requests', status, retry_after(headers))
+    if status >= 500:
+        raise exceptions.ServerError('Server error {0}'.format(status), status)
+    if status != 200:
+        raise exceptions.SwapiError('Unexpected response {0}'.format(status), status)
 
-def query(query):
-    headers = {'User-Agent': 'swapi-python'}
-    response = requests.get(query) #, headers=headers)
-    if response.status_code != 200:
-        raise exceptions.ResourceDoesNotExist('Resource does not exist')
+
+def _fetch(url, headers=None):
+    response = get_client().get(url, headers=headers)
+    raise_for_status(response.status_code, response.headers)
+    return response
+
+
+def _revalidate(cache, url, cached):
+    ''' Conditional GET of a cached url, refreshing the stored entry '''
+    response = get_client().get(url, headers=cached.validators())
+    if response.status_code == 304:
+        cache.touch(url)
+        return cached
+    raise_for_status(response.status_code, response.headers)
+    cache.set(url, response)
     return response
 
 
+def page_url(url, number):
+    ''' Return the url of a page of a list endpoint '''
+    if number == 1:
+        return url
+    return '{0}?page={1}'.format(url, number)
+
+
+def is_page_url(link, url, number):
+    ''' Tell if link is page number of the list endpoint url
+
+    Only the path and the page are compared, swapi answers with https
+    links and its own host, whatever the scheme and host it was asked on.
+    '''
+    link, url = urlparse(link), urlparse(url)
+    if link.path.rstrip('/') != url.path.rstrip('/'):
+        return False
+    page = parse_qs(link.query).get('page', ['1'])
+    return page == [str(number)]
+
+
+def all_resources(url, pages=None, revalidate=False, backend=None):
+    ''' Get the JSON data of every resource of a list endpoint
+
+    The first page gives the count and the page size, so the remaining
+    pages are fetched concurrently. When they can't be computed, or the
+    computed pages don't add up, the next links are followed instead.
+    pages holds the already decoded pages by number, if the caller has some,
+    and backend is passed to query().
+    '''
+    pages = dict(pages or {})
+    if 1 not in pages:
+        pages[1] = loads(query(url, revalidate, backend).content)
+    first_page = pages[1]
+    resources = list(first_page['results'])
+    if not first_page['next']:
+        return resources
+
+    page_size = len(first_page['results'])
+    count = first_page.get('count')
+    if isinstance(count, int) and page_size and is_page_url(first_page['next'], url, 2):
+        numbers = range(2, -(-count // page_size) + 1)
+        try:
+            pages.update(_fetch_pages(url, [n for n in numbers if n not in pages], revalidate, backend))
+        except exceptions.ResourceDoesNotExist:
+            pass
+        else:
+            for number in numbers:
+                resources.extend(pages[number]['results'])
+            last_page = pages[numbers[-1]] if numbers else first_page
+            if len(resources) == count and not last_page['next']:
+                return resources
+
+    # Fall back to following the next links, from the first page we already have
+    resources = list(first_page['results'])
+    json_data = first_page
+    while json_data['next']:
+        json_data = loads(query(json_data['next'], revalidate, backend).content)
+        resources.extend(json_data['results'])
+    return resources
+
+
+def iter_pages(url, pages=None):
+    ''' Yield the results of each page of a list endpoint, in order, as soon as it arrives
+
+    Like all_resources(), the pages after the first are requested
+    concurrently when the count allows it, and the next links are
+    followed otherwise, or from the last good page if a computed page
+    is missing.
+    '''
+    pages = dict(pages or {})
+    json_data = pages[1] if 1 in pages else loads(query(url).content)
+    yield json_data['results']
+
+    page_size = len(json_data['results'])
+    count = json_data.get('count')
+    if json_data['next'] and isinstance(count, int) and page_size \
+            and is_page_url(json_data['next'], url, 2):
+        numbers = range(2, -(-count // page_size) + 1)
+        executor = ThreadPoolExecutor(max_workers=min(settings.MAX_WORKERS, len(numbers)))
+        try:
+            futures = [
+                None if n in pages else executor.submit(query, page_url(url, n))
+                for n in numbers
+            ]
+            for number, future in zip(numbers, futures):
+                try:
+                    page = pages[number] if future is None else loads(future.result().content)
+                except exceptions.ResourceDoesNotExist:
+                    break
+                json_data = page
+                yield json_data['results']
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # Follow the next links, from the last page we have
+    while json_data['next']:
+        json_data = loads(query(json_data['next']).content)
+        yield json_data['results']
+
+
+def _fetch_pages(url, numbers, revalidate=False, backend=None):
+    ''' Fetch the given pages of a list endpoint on a bounded thread pool '''
+    if not numbers:
+        return {}
+    max_workers = min(settings.MAX_WORKERS, len(numbers))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = executor.map(
+            lambda page: query(page, revalidate, backend), [page_url(url, n) for n in numbers]
+        )
+        return {n: loads(r.content) for n, r in zip(numbers, responses)}
+
+
 def all_resource_urls(query):
     ''' Get all the URLs for every resource '''
-    urls = []
-    next = True
-    while next:
-        response = requests.get(query)
-        json_data = json.loads(response.content)
-        for resource in json_data['results']:
-            urls.append(resource['url'])
-        if bool(json_data['next']):
-            query = json_data['next']
-        else:
-            next = False
-    return urls
\ No newline at end of file
+    return [resource['url'] for resource in all_resources(query)]
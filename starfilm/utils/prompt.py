@@ -29,6 +29,9 @@ def ask_username() -> str:
 def ask_password() -> str:
     return Prompt.ask("[blue]Password", password=True)
 
+def ask_search() -> str:
+    return Prompt.ask("\n[blue]Search [dim](empty to go back)[/dim]")
+
 def ask_episode_id(list_id: list[str]) -> str:
     return IntPrompt.ask("[blue]Episode ID", choices=list_id, show_choices=False)
 
@@ -0,0 +1,37 @@
+"""Helpers shared by the tests
+"""
+import unittest
+
+import starfilm  # Puts the swapi modules on sys.path
+from swapi import settings
+from swapi.cache import set_cache
+from swapi.identity import identity_map
+from swapi.standin import StandIn, load_fixtures
+
+
+class StandInTestCase(unittest.TestCase):
+    """Base of the tests run against a swapi.standin server over the bundled fixtures
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = load_fixtures(settings.FIXTURES_PATH)
+
+    def setUp(self):
+        self.patch(settings, "BASE_URL", settings.BASE_URL)
+        self.patch(settings, "BACKEND", "http")
+        set_cache(None)
+        identity_map.clear()
+        self.addCleanup(identity_map.clear)
+
+    def patch(self, obj, name, value):
+        self.addCleanup(setattr, obj, name, getattr(obj, name))
+        setattr(obj, name, value)
+
+    def serve(self, **kwargs):
+        """Start a stand-in server and point settings.BASE_URL to it
+        """
+        server = StandIn(self.catalog, **kwargs).start()
+        self.addCleanup(server.stop)
+        settings.BASE_URL = server.base_url
+        return server
@@ -0,0 +1,82 @@
+import asyncio
+import time
+import unittest
+
+from support import StandInTestCase
+from swapi import aswapi, swapi
+from swapi.cache import ResponseCache, set_cache
+from swapi.identity import identity_map
+
+
+def run(coroutine):
+    """Run a coroutine of aswapi on a fresh event loop, closing its client afterwards
+    """
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await aswapi.close()
+    return asyncio.run(main())
+
+
+class AsyncSwapiTest(StandInTestCase):
+
+    def test_all_resources(self):
+        server = self.serve(latency=0.3)
+        start = time.perf_counter()
+        people = run(aswapi.get_all("people"))
+        # The 8 pages after the first are fetched at once, not one after the other
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertEqual(sorted(person.id for person in people.items), list(range(1, 83)))
+        self.assertEqual(server.hits, 9)
+
+    def test_all_resources_next_links(self):
+        server = self.serve()
+        page = server.page
+
+        def page_without_count(resource, number):
+            json_data = page(resource, number)
+            if json_data is not None:
+                del json_data["count"]
+            return json_data
+        server.page = page_without_count
+
+        self.assertEqual(len(run(aswapi.all_resources(server.base_url + "/people/"))), 82)
+        self.assertEqual(server.hits, 9)
+
+    def test_cache(self):
+        cache = set_cache(ResponseCache(":memory:", stale_while_revalidate=False))
+        self.addCleanup(set_cache, None)
+        server = self.serve()
+        url = server.base_url + "/planets/"
+        planets = run(aswapi.all_resources(url))
+        self.assertEqual(server.hits, 6)
+        self.assertEqual(run(aswapi.all_resources(url)), planets)
+        self.assertEqual(server.hits, 6)
+
+        # Expired: revalidated with the ETags, the server answers 304
+        cache.ttl = 0
+        self.assertEqual(run(aswapi.all_resources(url)), planets)
+        self.assertEqual(server.hits, 12)
+
+    def test_identity(self):
+        server = self.serve()
+        person = swapi.get_person(1)
+        self.assertIs(run(aswapi.get_person(1)), person)
+        self.assertEqual(server.hits, 1)
+
+        film = run(aswapi.get_film(1))
+        self.assertIs(identity_map.get(film.url), film)
+        self.assertIs(swapi.get_film(1), film)
+
+    def test_homeworld(self):
+        server = self.serve()
+        person = run(aswapi.get_person(1))
+        planet = run(aswapi.get_homeworld(person))
+        self.assertIs(person.get_homeworld(), planet)
+        self.assertIs(run(aswapi.get_homeworld(person)), planet)
+        self.assertEqual(server.hits, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
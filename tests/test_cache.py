@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import starfilm  # Puts the swapi modules on sys.path
+from swapi.cache import CachedResponse, ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "swapi.sqlite")
+
+    def make_cache(self, **kwargs):
+        cache = ResponseCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def accessed_at(self, url):
+        """Access time of url as another process reads it
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute("SELECT accessed_at FROM responses WHERE url = ?", (url,)).fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_hits_batched(self):
+        cache = self.make_cache(touch_batch=2)
+        cache.set("a", CachedResponse("a", b"{}"))
+        cache.set("b", CachedResponse("b", b"{}"))
+        stored = self.accessed_at("a")
+
+        for _ in range(2):
+            self.assertEqual(cache.get("a").content, b"{}")
+        # Not written at each hit
+        self.assertEqual(self.accessed_at("a"), stored)
+        # Written with the hit of a second url
+        cache.get("b")
+        self.assertGreater(self.accessed_at("a"), stored)
+
+    def test_flushed_on_close(self):
+        cache = self.make_cache()
+        cache.set("a", CachedResponse("a", b"{}"))
+        stored = self.accessed_at("a")
+        cache.get("a")
+        cache.close()
+        self.assertGreater(self.accessed_at("a"), stored)
+
+    def test_eviction_order(self):
+        cache = self.make_cache(max_size=20)
+        cache.set("a", CachedResponse("a", b"a" * 10))
+        cache.set("b", CachedResponse("b", b"b" * 10))
+        # The pending hit of a makes b the least recently used
+        cache.get("a")
+        cache.set("c", CachedResponse("c", b"c" * 10))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
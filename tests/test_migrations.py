@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+
+from starfilm.migrations import MIGRATIONS, migrate, schema_version
+
+
+# Schema of db_StarFilm.db before the migrations: the association tables have no key
+SCHEMA_V0 = [
+    "CREATE TABLE Users(idUser INT, username VARCHAR(100) NOT NULL, password VARCHAR(300) NOT NULL, PRIMARY KEY(idUser), UNIQUE(username))",
+    "CREATE TABLE Favorites(idEpisode INT, PRIMARY KEY(idEpisode))",
+    "CREATE TABLE Roles(IdRole INT, label VARCHAR(50) NOT NULL, PRIMARY KEY(IdRole))",
+    "CREATE TABLE user_has_favorite(idUser INT, idEpisode INT)",
+    "CREATE TABLE user_has_role(idUser INT, IdRole INT)",
+    "INSERT INTO Users VALUES (0, 'client', 'client'), (1, 'admin', 'admin')",
+    "INSERT INTO Favorites VALUES (1), (2), (3), (4), (5), (6)",
+    "INSERT INTO Roles VALUES (0, 'admin'), (1, 'client')",
+    # (0, 2) is a duplicated favorite and (1, 0) a duplicated role
+    "INSERT INTO user_has_favorite VALUES (0, 2), (0, 2), (0, 3), (1, 2), (1, 5)",
+    "INSERT INTO user_has_role VALUES (1, 0), (1, 0), (0, 1)",
+]
+
+# Query plan expected for the lookups of models.py
+QUERY_PLANS = {
+    "favorites of a user": (
+        "SELECT Favorites.idEpisode FROM Favorites"
+        " JOIN user_has_favorite ON Favorites.idEpisode = user_has_favorite.idEpisode"
+        " JOIN Users ON Users.idUser = user_has_favorite.idUser WHERE Users.username = ?",
+        ["SEARCH Users USING INDEX sqlite_autoindex_Users_2 (username=?)",
+         "SEARCH user_has_favorite USING COVERING INDEX user_has_favorite_user_episode (idUser=?)",
+         "SEARCH Favorites USING COVERING INDEX sqlite_autoindex_Favorites_1 (idEpisode=?)"],
+    ),
+    "users of an episode": (
+        "SELECT idUser FROM user_has_favorite WHERE idEpisode = ?",
+        ["SEARCH user_has_favorite USING COVERING INDEX user_has_favorite_episode_user (idEpisode=?)"],
+    ),
+    "roles of a user": (
+        "SELECT Roles.label FROM Roles"
+        " JOIN user_has_role ON Roles.IdRole = user_has_role.IdRole"
+        " JOIN Users ON Users.idUser = user_has_role.idUser WHERE Users.username = ?",
+        ["SEARCH Users USING INDEX sqlite_autoindex_Users_2 (username=?)",
+         "SEARCH user_has_role USING COVERING INDEX user_has_role_user_role (idUser=?)",
+         "SEARCH Roles USING INDEX sqlite_autoindex_Roles_1 (IdRole=?)"],
+    ),
+    "users of a role": (
+        "SELECT idUser FROM user_has_role WHERE IdRole = ?",
+        ["SEARCH user_has_role USING COVERING INDEX user_has_role_role_user (IdRole=?)"],
+    ),
+    "top favorites": (
+        "SELECT idEpisode, favorite_count FROM Favorites"
+        " WHERE favorite_count > 0 ORDER BY favorite_count DESC, idEpisode",
+        ["SEARCH Favorites USING COVERING INDEX Favorites_favorite_count (favorite_count>?)"],
+    ),
+}
+
+
+class MigrateTest(unittest.TestCase):
+    """migrate() on a temporary database with the schema of the original db_StarFilm.db
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "db_StarFilm.db")
+        with sqlite3.connect(self.path) as connection:
+            for statement in SCHEMA_V0:
+                connection.execute(statement)
+        connection.close()
+        self.engine = create_engine("sqlite:///" + self.path)
+        self.addCleanup(self.engine.dispose)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_migrate(self):
+        self.assertEqual(migrate(self.engine), [version for version, _, _ in MIGRATIONS])
+        connection = self.connect()
+        self.assertEqual(schema_version(connection), MIGRATIONS[-1][0])
+        # Applied once only
+        self.assertEqual(migrate(self.engine), [])
+
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM user_has_favorite").fetchone()[0], 4)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM user_has_role").fetchone()[0], 2)
+        with self.assertRaises(sqlite3.IntegrityError):
+            connection.execute("INSERT INTO user_has_favorite VALUES (0, 3)")
+
+    def test_migrate_target(self):
+        self.assertEqual(migrate(self.engine, target=1), [1])
+        self.assertEqual(schema_version(self.connect()), 1)
+        self.assertEqual(migrate(self.engine), [version for version, _, _ in MIGRATIONS[1:]])
+
+    def test_favorite_counts(self):
+        migrate(self.engine)
+        connection = self.connect()
+        counts = "SELECT idEpisode, favorite_count FROM Favorites WHERE favorite_count > 0"
+        self.assertEqual(dict(connection.execute(counts)), {2: 2, 3: 1, 5: 1})
+
+        connection.execute("INSERT INTO user_has_favorite VALUES (1, 3)")
+        connection.execute("DELETE FROM user_has_favorite WHERE idUser = 1 AND idEpisode = 5")
+        connection.execute("UPDATE user_has_favorite SET idEpisode = 6 WHERE idUser = 0 AND idEpisode = 2")
+        self.assertEqual(dict(connection.execute(counts)), {2: 1, 3: 2, 6: 1})
+
+    def test_query_plans(self):
+        migrate(self.engine)
+        connection = self.connect()
+        for name, (query, expected) in QUERY_PLANS.items():
+            with self.subTest(name):
+                plan = [
+                    # SQLite before 3.36 says "SEARCH TABLE x"
+                    row[3].replace("SEARCH TABLE ", "SEARCH ").replace("SCAN TABLE ", "SCAN ")
+                    for row in connection.execute("EXPLAIN QUERY PLAN " + query, ("admin",) * query.count("?"))
+                ]
+                self.assertEqual(plan, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
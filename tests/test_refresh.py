@@ -0,0 +1,77 @@
+import unittest
+
+from support import StandInTestCase
+from swapi import swapi
+from swapi.models import FilmQuerySet, PeopleQuerySet
+
+
+def edit(server, resource, id, **fields):
+    """Change a resource served by the stand-in, as swapi would: with a new edited timestamp
+    """
+    data = server.catalog[resource][id]
+    data.update(fields, edited="2024-01-01T00:00:00.000000Z")
+
+
+class RefreshChangedTest(StandInTestCase):
+
+    def test_changed_reindexed(self):
+        server = self.serve()
+        people = swapi.get_all("people")
+        person = people.get(5)
+        old_name = person.name
+        edit(server, "people", 5, name="Zorgon Blix")
+
+        report = people.refresh_changed()
+        self.assertEqual(report.changed, [person])
+        self.assertEqual(person.name, "Zorgon Blix")
+        self.assertEqual(swapi.search("zorgon"), [person])
+        self.assertNotIn(person, swapi.search(old_name))
+
+    def test_filtered(self):
+        server = self.serve()
+        films = swapi.get_all("films").filter(episode_id__in=[4, 5])
+        held = list(films.items)
+        edit(server, "films", 2, title="The Empire Strikes Again")
+
+        report = films.refresh_changed()
+        self.assertEqual(str(report), "0 new, 1 changed, 0 removed")
+        self.assertEqual(films.items, held)
+        # Still searchable
+        self.assertEqual([film.title for film in swapi.search("hope", ["films"])], ["A New Hope"])
+        self.assertEqual([film.id for film in swapi.search("strikes again", ["films"])], [2])
+
+    def test_from_results(self):
+        server = self.serve()
+        films = FilmQuerySet.from_results(list(server.catalog["films"].values()))
+
+        report = films.refresh_changed()
+        self.assertFalse(report)
+        self.assertEqual(films.count(), 6)
+        self.assertEqual(len(swapi.search("hope", ["films"])), 1)
+
+    def test_removed_from_list(self):
+        server = self.serve()
+        people = swapi.get_all("people")
+        people.items
+        person = server.catalog["people"].pop(82)
+
+        report = people.refresh_changed()
+        self.assertEqual([item.id for item in report.removed], [82])
+        self.assertEqual(people.count(), 81)
+        self.assertEqual(swapi.search(person["name"]), [])
+
+    def test_failed_url_kept(self):
+        server = self.serve()
+        urls = [server.base_url + "/people/{0}/".format(id) for id in (1, 2)]
+        people = PeopleQuerySet(urls)
+        held = list(people.items)
+        del server.catalog["people"][2]
+
+        report = people.refresh_changed()
+        self.assertFalse(report)
+        self.assertEqual(people.items, held)
+        self.assertEqual(list(people.errors), [urls[1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from support import StandInTestCase
+from swapi import settings, swapi
+from swapi.exceptions import ResourceDoesNotExist
+from swapi.standin import COUNTS
+
+
+class StandInTest(StandInTestCase):
+
+    def test_fixtures(self):
+        self.assertEqual({resource: len(resources) for resource, resources in self.catalog.items()}, COUNTS)
+
+    def test_pages(self):
+        server = self.serve()
+        status, page = server.answer("/api/people/?page=9")
+        self.assertEqual(status, 200)
+        self.assertEqual((page["count"], len(page["results"]), page["next"]), (82, 2, None))
+        self.assertEqual(page["previous"], server.base_url + "/people/?page=8")
+        self.assertEqual(server.answer("/api/people/?page=10")[0], 404)
+        self.assertEqual(server.answer("/api/people/83/")[0], 404)
+        # Every url points to the server
+        self.assertTrue(page["results"][0]["homeworld"].startswith(server.base_url + "/planets/"))
+
+    def test_get_all(self):
+        server = self.serve()
+        for resource, count in COUNTS.items():
+            with self.subTest(resource):
+                items = swapi.get_all(resource).items
+                self.assertEqual(sorted(item.id for item in items), list(range(1, count + 1)))
+        # One request per page
+        self.assertEqual(server.hits, sum(-(-count // 10) for count in COUNTS.values()))
+
+    def test_relations(self):
+        self.serve()
+        film = swapi.get_film(1)
+        self.assertEqual(film.title, "A New Hope")
+        characters = film.get_characters().items
+        self.assertEqual(len(characters), len(film.characters))
+        for character in characters:
+            self.assertIn(film.url, character.films)
+
+    def test_not_found(self):
+        self.serve()
+        with self.assertRaises(ResourceDoesNotExist):
+            swapi.get_person(1000)
+
+    def test_retries(self):
+        self.patch(settings, "BACKOFF_BASE", 0.01)
+        server = self.serve(error_rate=0.2, throttle_rate=0.1, retry_after=0, seed=1)
+        self.assertEqual(swapi.get_all("people").count(), 82)
+        self.assertEqual(len(swapi.get_all("people").items), 82)
+        # The 503s and the 429s were retried
+        self.assertGreater(server.hits, 9)
+
+
+if __name__ == "__main__":
+    unittest.main()